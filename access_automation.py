@@ -1,17 +1,21 @@
-from atlassian import Confluence
 import logging
-import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
+from confluence_client import get_client
+from confluence_index import membership_index, permission_index
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', '8'))
+BULK_BATCH = int(os.getenv('BULK_BATCH', '50'))
+
 class AccessManager:
-    def __init__(self, url, username, password):
-        self.confluence = Confluence(
-            url=url,
-            username=username,
-            password=password
-        )
+    def __init__(self, url, username=None, password=None, auth=None):
+        self.client = get_client(url, username, password, auth=auth, consumer='provisioning')
+        self.confluence = self.client.confluence
+        self.memberships = membership_index(self.client)
+        self.permissions = permission_index(self.client)
 
     def get_username(self, lan_id, email, domain):
         # r1-core uses LAN ID, others use email
@@ -24,7 +28,6 @@ class AccessManager:
         except Exception:
             logger.info(f"Creating user {username}...")
             try:
-                endpoint = f"{self.confluence.url}/rest/api/admin/user"
                 payload = {
                     "userName": username,
                     "fullName": full_name,
@@ -33,12 +36,7 @@ class AccessManager:
                     "notifyViaEmail": False
                 }
                 
-                resp = requests.post(
-                    endpoint,
-                    json=payload,
-                    auth=(self.confluence.username, self.confluence.password),
-                    headers={"Accept": "application/json", "Content-Type": "application/json"}
-                )
+                resp = self.client.post("/rest/api/admin/user", json=payload)
                 
                 if resp.status_code in [200, 201]:
                     user = self.confluence.get_user_details_by_username(username)
@@ -52,7 +50,8 @@ class AccessManager:
         # Ensure license
         if not self.is_user_in_group(username, "confluence-users"):
             try:
-                self.confluence.add_user_to_group(username, "confluence-users")
+                self.confluence.add_user_to_group(username=username, group_name="confluence-users")
+                self.memberships.added("confluence-users", username)
             except Exception as e:
                 logger.error(f"License assignment failed: {e}")
         
@@ -60,23 +59,15 @@ class AccessManager:
 
     def is_user_in_group(self, username, group_name):
         try:
-            members = self.confluence.get_group_members(group_name)
-            return any(m.get('username') == username for m in members)
+            return self.memberships.contains(group_name, username)
         except Exception:
             return False
 
     def is_space_admin(self, space_key, username):
         try:
-            details = self.confluence.get_user_details_by_username(username)
-            ukey = details.get('userKey')
-            perms = self.confluence.get_all_space_permissions(space_key)
-            for p in perms:
-                if (p.get('operation', {}).get('operationKey') == 'administer' and 
-                    p.get('subject', {}).get('userKey') == ukey):
-                    return True
+            return self.permissions.is_admin(space_key, username)
         except Exception:
-            pass
-        return False
+            return False
 
     def ensure_space_groups_exist(self, space_key):
         for gtype in ['read', 'dev', 'admin']:
@@ -112,7 +103,8 @@ class AccessManager:
         group = f"{key}_{access}"
         try:
             if not self.is_user_in_group(username, group):
-                self.confluence.add_user_to_group(username, group)
+                self.confluence.add_user_to_group(username=username, group_name=group)
+                self.memberships.added(group, username)
             
             return {
                 "status": "success", 
@@ -123,6 +115,84 @@ class AccessManager:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def process_bulk(self, rows, progress=None, workers=BULK_WORKERS, batch_size=BULK_BATCH):
+        # Same result per row as process_request, but users are resolved together,
+        # groups created once per space and members added per group in batches.
+        results = [None] * len(rows)
+
+        def finish(i, res):
+            results[i] = res
+            if progress:
+                progress(i, res)
+
+        users = {}
+        for i, row in enumerate(rows):
+            users.setdefault(self.get_username(row.get('lan_id'), row.get('email'), row.get('domain')), []).append(i)
+
+        # everyone already in the license group exists, only look up the rest
+        try:
+            licensed = self.memberships.members("confluence-users")
+        except Exception:
+            licensed = set()
+        unknown = [u for u in users if u not in licensed]
+
+        def setup(username):
+            row = rows[users[username][0]]
+            return self.ensure_user_exists(row.get('email'), row.get('full_name'), username, row.get('email'))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for username, info in zip(unknown, pool.map(setup, unknown)):
+                if not info:
+                    for i in users.pop(username):
+                        finish(i, {"status": "error", "message": "User setup failed"})
+            logger.info(f"Bulk: {len(users)} users ready ({len(unknown)} looked up), {len(rows)} rows")
+
+            for key in {rows[i].get('space_key') for ids in users.values() for i in ids}:
+                self.ensure_space_groups_exist(key)
+
+            targets = {}
+            for username, ids in users.items():
+                for i in ids:
+                    row = rows[i]
+                    key = row.get('space_key')
+                    access = row.get('access', 'read')
+                    if access == 'admin':
+                        if not (self.is_space_admin(key, row.get('manager')) or self.is_space_admin(key, row.get('requester'))):
+                            logger.warning(f"Admin denied for {username}. Downgrading to dev.")
+                            access = 'dev'
+                    targets.setdefault(f"{key}_{access}", {}).setdefault(username, []).append((i, access))
+
+            for group, members in targets.items():
+                try:
+                    current = set(self.memberships.members(group))
+                except Exception:
+                    current = set()
+                for username in [u for u in members if u in current]:
+                    for i, access in members.pop(username):
+                        finish(i, {"status": "success", "username": username, "access_granted": access, "group": group})
+
+                def add(username):
+                    self.confluence.add_user_to_group(username=username, group_name=group)
+                    self.memberships.added(group, username)
+
+                todo = list(members)
+                for start in range(0, len(todo), batch_size):
+                    batch = todo[start:start + batch_size]
+                    for username, error in zip(batch, pool.map(lambda u: self._attempt(add, u), batch)):
+                        for i, access in members[username]:
+                            if error:
+                                finish(i, {"status": "error", "message": error})
+                            else:
+                                finish(i, {"status": "success", "username": username, "access_granted": access, "group": group})
+        return results
+
+    def _attempt(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            return str(e)
+        return None
+
 if __name__ == "__main__":
     from vault_utils import VaultManager
     import sys
@@ -0,0 +1,207 @@
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# above this many entries the list is held as a Bloom filter instead of a set
+BLOOM_THRESHOLD = int(os.getenv('ALLOWLIST_BLOOM_THRESHOLD', '1000000'))
+# chance that a real secret is taken for an allowlisted one
+BLOOM_ERROR = float(os.getenv('ALLOWLIST_BLOOM_ERROR', '1e-9'))
+
+
+_key = None
+_key_lock = threading.Lock()
+
+
+def fingerprint_key():
+    # FINGERPRINT_KEY, else the key in Vault through the shared credential
+    # provider, read on the first fingerprint rather than on import. There is
+    # no fallback: a made-up key would give fingerprints nothing else matches.
+    global _key
+    if _key is None:
+        with _key_lock:
+            if _key is None:
+                key = os.getenv('FINGERPRINT_KEY')
+                if not key:
+                    from vault_utils import confluence_auth
+                    try:
+                        key = confluence_auth().provider.fingerprint_key()
+                    except Exception as e:
+                        raise RuntimeError(f"No FINGERPRINT_KEY and no fingerprint key in Vault: {e}")
+                _key = key.encode()
+    return _key
+
+
+def fingerprint(secret_type, text):
+    # what the allowlist (and anything else that must not keep the secret) stores;
+    # keyed, so a leaked fingerprint can't be checked against guessed passwords
+    msg = f"{secret_type}\0{text}".encode('utf-8', 'surrogatepass')
+    return hmac.new(fingerprint_key(), msg, hashlib.sha256).hexdigest()
+
+
+def scope_key(fp, space=None, page=None):
+    if page:
+        return f"{fp}:page:{page}"
+    if space:
+        return f"{fp}:space:{space.upper()}"
+    return fp
+
+
+def keys_version(keys):
+    # changes whenever an entry is added or removed, not when the file is reformatted
+    return hashlib.sha256('\n'.join(sorted(keys)).encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+
+
+def load_keys(path):
+    # [{"type": "Password", "text": "changeme", "space": "TRAIN"},
+    #  {"fingerprint": "9f86...", "page": "12345"}, ...]
+    with open(path) as f:
+        entries = json.load(f)
+    keys = set()
+    for e in entries:
+        fp = e.get('fingerprint') or fingerprint(e['type'], e['text'])
+        keys.add(scope_key(fp, e.get('space'), e.get('page')))
+    return keys
+
+
+class BloomFilter:
+    def __init__(self, count, error_rate=BLOOM_ERROR):
+        count = max(1, count)
+        self.size = max(64, int(-count * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / count * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def __len__(self):
+        return self.count
+
+
+class Allowlist:
+    # Known harmless findings (sample passwords in training spaces etc.), by
+    # fingerprint, for everywhere or one space or one page. A lookup is a
+    # hash and at most three set probes, whatever the size of the list.
+    def __init__(self, path=None, bloom_threshold=BLOOM_THRESHOLD, bloom_error=BLOOM_ERROR):
+        self.path = path
+        self.bloom_threshold = bloom_threshold
+        self.bloom_error = bloom_error
+        self.entries = frozenset()
+        self._version = keys_version(())
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.counts = {'reloads': 0, 'failures': 0, 'suppressed': 0}
+        self.by_type = {}
+        # text entries need the fingerprint key, so the file is read on first
+        # use instead of on import; until then (or while the key can't be had)
+        # nothing is suppressed
+        self.pending = bool(path)
+        self.retry_at = 0.0
+        self.load_lock = threading.Lock()
+
+    def ensure_loaded(self):
+        if not self.pending or time.monotonic() < self.retry_at:
+            return
+        with self.load_lock:
+            if self.pending and time.monotonic() >= self.retry_at:
+                if self.reload():
+                    self.pending = False
+                else:
+                    self.retry_at = time.monotonic() + 30
+
+    @property
+    def version(self):
+        self.ensure_loaded()
+        return self._version
+
+    def reload(self):
+        if not self.path:
+            return False
+        try:
+            keys = load_keys(self.path) if os.path.exists(self.path) else set()
+        except Exception as e:
+            # a broken file keeps the list we already have
+            with self.lock:
+                self.counts['failures'] += 1
+            logger.error(f"Could not load allowlist {self.path}: {e}")
+            return False
+        if len(keys) > self.bloom_threshold:
+            entries = BloomFilter(len(keys), self.bloom_error)
+            for key in keys:
+                entries.add(key)
+        else:
+            entries = frozenset(keys)
+        # one reference swap, so a scan sees either the old list or the new one
+        self.entries = entries
+        self._version = keys_version(keys)
+        self.pending = False
+        with self.lock:
+            self.counts['reloads'] += 1
+            self.loaded_at = time.time()
+        logger.info(f"Loaded {len(keys)} allowlist entries from {self.path}")
+        return True
+
+    def allowed(self, secret, space=None, page=None):
+        self.ensure_loaded()
+        entries = self.entries
+        if not len(entries):
+            return False
+        fp = fingerprint(secret['type'], secret['text'])
+        return (fp in entries or (space and scope_key(fp, space=space) in entries)
+                or (page and scope_key(fp, page=page) in entries))
+
+    def filter(self, secrets, space=None, page=None):
+        if not secrets:
+            return secrets
+        self.ensure_loaded()
+        if not len(self.entries):
+            return secrets
+        kept = []
+        for sec in secrets:
+            if self.allowed(sec, space, page):
+                with self.lock:
+                    self.counts['suppressed'] += 1
+                    self.by_type[sec['type']] = self.by_type.get(sec['type'], 0) + 1
+            else:
+                kept.append(sec)
+        return kept
+
+    def stats(self):
+        entries = self.entries
+        with self.lock:
+            return {**self.counts, 'entries': len(entries), 'version': self._version, 'pending': self.pending, 'bloom': isinstance(entries, BloomFilter),
+                    'suppressed_by_type': dict(self.by_type), 'loaded_at': self.loaded_at}
+
+
+if __name__ == "__main__":
+    # python allowlist.py Password changeme [--space KEY | --page ID]
+    # prints an entry to paste into the allowlist file without the text itself,
+    # fingerprinted with the same FINGERPRINT_KEY (or Vault key) as the scanner
+    args = sys.argv[1:]
+    if len(args) not in (2, 4) or (len(args) == 4 and args[2] not in ('--space', '--page')):
+        sys.exit("usage: python allowlist.py TYPE TEXT [--space KEY | --page ID]")
+    try:
+        entry = {'fingerprint': fingerprint(args[0], args[1])}
+    except RuntimeError as e:
+        sys.exit(str(e))
+    if len(args) == 4:
+        entry[args[2].lstrip('-')] = args[3]
+    print(json.dumps(entry))
@@ -0,0 +1,109 @@
+import codecs
+import logging
+from scan_engine import engine
+
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = (
+    'text/', 'application/json', 'application/xml', 'application/yaml', 'application/x-yaml',
+    'application/x-sh', 'application/x-pem-file', 'application/octet-stream'
+)
+TEXT_EXTENSIONS = (
+    '.env', '.txt', '.yaml', '.yml', '.log', '.json', '.xml', '.properties', '.conf', '.cfg',
+    '.ini', '.toml', '.sh', '.ps1', '.py', '.pem', '.key', '.tf', '.tfvars', '.csv'
+)
+
+
+class AttachmentScanner:
+    def __init__(self, session, url, max_bytes=20 * 1024 * 1024, chunk_size=64 * 1024, overlap=4096):
+        self.session = session
+        self.url = url
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def list_attachments(self, page_id):
+        start = 0
+        while True:
+            r = self.session.get(
+                f"{self.url}/rest/api/content/{page_id}/child/attachment",
+                params={'start': start, 'limit': 100, 'expand': 'version'}, timeout=30
+            )
+            r.raise_for_status()
+            res = r.json()
+            results = res.get('results', [])
+            yield from results
+            # Confluence may return fewer than asked for, so only a missing next link ends it
+            if not results or 'next' not in res.get('_links', {}):
+                return
+            start += len(results)
+
+    def allowed(self, att):
+        title = att.get('title', '').lower()
+        media = att.get('metadata', {}).get('mediaType', '')
+        size = att.get('extensions', {}).get('fileSize') or 0
+        if size > self.max_bytes:
+            return False
+        # octet-stream is only trusted when the name says it's text (.env etc.)
+        if media == 'application/octet-stream':
+            return title.endswith(TEXT_EXTENSIONS)
+        return media.startswith(TEXT_TYPES) or title.endswith(TEXT_EXTENSIONS)
+
+    def scan_stream(self, chunks):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        carry = ''
+        base = 0
+        last_end = {}
+        found = []
+        done = False
+        while not done:
+            chunk = next(chunks, None)
+            done = chunk is None
+            buf = carry + (decoder.decode(b'', final=True) if done else decoder.decode(chunk))
+            # the tail is held back and scanned again with the next chunk
+            limit = len(buf) if done else max(0, len(buf) - self.overlap)
+            resume = {t: end - base for t, end in last_end.items() if end > base}
+            for sec in engine.scan(buf, 0, limit, resume):
+                last_end[sec['type']] = base + sec['end']
+                found.append({'type': sec['type'], 'text': sec['text'], 'start': base + sec['start'], 'end': base + sec['end']})
+            carry = buf[limit:]
+            base += limit
+        return found
+
+    def scan_attachment(self, att):
+        r = self.session.get(f"{self.url}{att['_links']['download']}", stream=True, timeout=60)
+        r.raise_for_status()
+        read = 0
+        truncated = False
+
+        def chunks():
+            nonlocal read, truncated
+            for chunk in r.iter_content(self.chunk_size):
+                read += len(chunk)
+                if read > self.max_bytes:
+                    truncated = True
+                    return
+                yield chunk
+
+        try:
+            found = self.scan_stream(chunks())
+        finally:
+            r.close()
+        return {
+            'id': att['id'], 'title': att['title'],
+            'version': att.get('version', {}).get('number'),
+            'bytes': read, 'truncated': truncated, 'findings': found
+        }
+
+    def scan_page(self, page_id, skip=None):
+        results = []
+        for att in self.list_attachments(page_id):
+            if not self.allowed(att):
+                continue
+            if skip and skip(att):
+                continue
+            try:
+                results.append(self.scan_attachment(att))
+            except Exception as e:
+                logger.error(f"Attachment {att.get('id')} on page {page_id} failed: {e}")
+        return results
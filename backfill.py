@@ -0,0 +1,192 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from confluence_client import get_client
+from findings_ledger import DEFAULT_PATH, FindingsLedger
+from scan_engine import MASK_MESSAGE, scan_content, mask_content
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+URL = os.getenv('CONFLUENCE_URL', "http://57.159.25.203:8090")
+
+
+class BackfillCrawler:
+    def __init__(self, url, username=None, password=None, workers=8, page_size=50,
+                 checkpoint='backfill_checkpoint.json', report=None, auth=None, ledger=None):
+        self.url = url
+        self.workers = workers
+        self.page_size = page_size
+        self.checkpoint_file = checkpoint
+        self.dry_run = report is not None
+        self.report = open(report, 'a') if report else None
+        # findings go to the same ledger as the scanner's, for /findings
+        self.ledger = ledger
+
+        self.client = get_client(url, username, password, auth=auth, consumer='backfill',
+                                 pool_size=workers, timeout=60)
+
+        self.lock = threading.Lock()
+        self.state = self.load_checkpoint()
+        self.counts = {'pages': 0, 'skipped': 0, 'with_secrets': 0, 'secrets': 0, 'masked': 0, 'errors': 0}
+        # page listing and scanning/masking, shared by every space being crawled
+        self.pool = None
+
+    def load_checkpoint(self):
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)
+        return {'spaces': {}}
+
+    def save_checkpoint(self, space_key, start, done=False):
+        with self.lock:
+            self.state['spaces'][space_key] = {'start': start, 'done': done}
+            tmp = f"{self.checkpoint_file}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.checkpoint_file)
+
+    def get(self, path, **params):
+        r = self.client.get(f"/rest/api/{path}", params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def list_spaces(self):
+        start = 0
+        while True:
+            res = self.get('space', start=start, limit=100)
+            results = res.get('results', [])
+            for space in results:
+                yield space['key']
+            # Confluence may return fewer than asked for, so only a missing next link ends it
+            if not results or 'next' not in res.get('_links', {}):
+                return
+            start += len(results)
+
+    def list_pages(self, space_key, start):
+        return self.get('content', spaceKey=space_key, type='page', status='current',
+                        expand='body.storage,version', start=start, limit=self.page_size)
+
+    def crawl_space(self, space_key):
+        start = self.state['spaces'].get(space_key, {}).get('start', 0)
+        # the next batch is fetched while this one is scanned, and the pages of
+        # a batch are scanned and masked side by side, so one big space keeps
+        # every worker busy too
+        batch = self.pool.submit(self.list_pages, space_key, start)
+        while True:
+            res = batch.result()
+            pages = res.get('results', [])
+            # the server may cap the limit, only a missing next link means the end
+            last = not pages or 'next' not in res.get('_links', {})
+            if not last:
+                batch = self.pool.submit(self.list_pages, space_key, start + len(pages))
+            for f in [self.pool.submit(self.process_page, space_key, page) for page in pages]:
+                f.result()
+            start += len(pages)
+            # only after the whole batch is done, so a resume never skips a page
+            self.save_checkpoint(space_key, start, done=last)
+            if last:
+                logger.info(f"Space {space_key} done ({start} pages)")
+                return
+
+    def process_page(self, space_key, page):
+        try:
+            if page['version'].get('message') == MASK_MESSAGE:
+                # our own masking is the latest version, nothing new to find
+                with self.lock:
+                    self.counts['skipped'] += 1
+                return
+            content = page['body']['storage']['value']
+            secrets = scan_content(content, space_key, page['id'])
+            with self.lock:
+                self.counts['pages'] += 1
+                if secrets:
+                    self.counts['with_secrets'] += 1
+                    self.counts['secrets'] += len(secrets)
+            if not secrets:
+                return
+            if self.ledger:
+                self.ledger.record(page['id'], space_key, page['version']['number'], secrets)
+            if self.dry_run:
+                self.write_findings(space_key, page, secrets)
+            else:
+                self.mask_page(page, mask_content(content, secrets))
+        except Exception as e:
+            logger.error(f"Page {page.get('id')} in {space_key} failed: {e}")
+            with self.lock:
+                self.counts['errors'] += 1
+
+    def write_findings(self, space_key, page, secrets):
+        # never write the secret itself
+        lines = [json.dumps({
+            'space': space_key, 'page_id': page['id'], 'title': page['title'],
+            'version': page['version']['number'], 'type': s['type'],
+            'start': s['start'], 'end': s['end'], 'length': len(s['text'])
+        }) for s in secrets]
+        with self.lock:
+            self.report.write('\n'.join(lines) + '\n')
+            self.report.flush()
+
+    def mask_page(self, page, masked):
+        r = self.client.put(f"/rest/api/content/{page['id']}", json={
+            "version": {"number": page['version']['number'] + 1, "message": MASK_MESSAGE},
+            "title": page['title'], "type": "page",
+            "body": {"storage": {"value": masked, "representation": "storage"}}
+        })
+        r.raise_for_status()
+        with self.lock:
+            self.counts['masked'] += 1
+
+    def run(self, spaces=None):
+        spaces = spaces or list(self.list_spaces())
+        todo = [k for k in spaces if not self.state['spaces'].get(k, {}).get('done')]
+        logger.info(f"Backfill: {len(todo)} of {len(spaces)} spaces left, {self.workers} workers")
+        # the space threads only hand out work, the requests run on self.pool
+        with ThreadPoolExecutor(max_workers=self.workers) as self.pool, \
+                ThreadPoolExecutor(max_workers=self.workers) as crawlers:
+            futures = {crawlers.submit(self.crawl_space, k): k for k in todo}
+            for f in as_completed(futures):
+                try:
+                    f.result()
+                except Exception as e:
+                    # checkpoint keeps the offset, a rerun picks the space up again
+                    logger.error(f"Space {futures[f]} stopped: {e}")
+        if self.report:
+            self.report.close()
+        if self.ledger:
+            self.ledger.flush()
+        return self.counts
+
+
+if __name__ == "__main__":
+    from vault_utils import confluence_auth
+
+    parser = argparse.ArgumentParser(description="Scan (and mask) every existing page in Confluence")
+    parser.add_argument('--space', action='append', help="only these space keys (repeatable)")
+    parser.add_argument('--workers', type=int, default=8, help="pages fetched/scanned/masked at once")
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--checkpoint', default='backfill_checkpoint.json')
+    parser.add_argument('--dry-run', metavar='REPORT', help="write findings to this JSONL file instead of masking")
+    parser.add_argument('--reset', action='store_true', help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    # a long crawl keeps working across a password rotation
+    auth = confluence_auth()
+    try:
+        auth.provider.get()
+    except Exception as e:
+        print(f"Vault error: {e}")
+        sys.exit(1)
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    findings_db = os.getenv('FINDINGS_DB', DEFAULT_PATH)
+    crawler = BackfillCrawler(URL, auth=auth, workers=args.workers, page_size=args.page_size,
+                              checkpoint=args.checkpoint, report=args.dry_run,
+                              ledger=FindingsLedger(findings_db) if findings_db else None)
+    print(crawler.run(args.space))
@@ -0,0 +1,183 @@
+from atlassian import Confluence
+import logging
+import os
+import threading
+import time
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import gauge, histogram, endpoint_label
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv('CONFLUENCE_POOL_SIZE', '20'))
+TIMEOUT = float(os.getenv('CONFLUENCE_TIMEOUT', '30'))
+RETRIES = int(os.getenv('CONFLUENCE_RETRIES', '3'))
+BACKOFF = float(os.getenv('CONFLUENCE_BACKOFF', '0.5'))
+# the provisioning limit; other consumers are unlimited unless
+# CONFLUENCE_RATE_LIMIT_<CONSUMER> (and _BURST) say otherwise
+RATE_LIMIT = float(os.getenv('CONFLUENCE_RATE_LIMIT', '20'))
+RATE_BURST = int(os.getenv('CONFLUENCE_RATE_BURST', str(max(1, int(RATE_LIMIT * 2)))))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+API_SECONDS = histogram('confluence_request_seconds', 'Confluence REST call latency (retries included)',
+                        ('method', 'endpoint', 'status'))
+
+
+class RateLimiter:
+    # token bucket, rate requests per second with bursts up to `burst`; 0 turns it off
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.counts = {'acquired': 0, 'waited': 0}
+        self.waited_seconds = 0.0
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # take the token now (possibly going negative) and sleep off the debt outside the lock
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.counts['acquired'] += 1
+            if wait:
+                self.counts['waited'] += 1
+                self.waited_seconds += wait
+        if wait:
+            time.sleep(wait)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'rate': self.rate, 'burst': self.burst,
+                    'waited_seconds': round(self.waited_seconds, 3)}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(consumer):
+    # one bucket per consumer (provisioning, scanner, backfill, ...), shared by
+    # all of its clients in the process, so a backfill doesn't eat the
+    # dashboard's budget or the other way round
+    with _limiters_lock:
+        limiter = _limiters.get(consumer)
+        if limiter is None:
+            name = consumer.upper()
+            rate = float(os.getenv(f"CONFLUENCE_RATE_LIMIT_{name}", str(RATE_LIMIT if consumer == 'provisioning' else 0)))
+            default_burst = RATE_BURST if consumer == 'provisioning' else max(1, int(rate * 2))
+            burst = int(os.getenv(f"CONFLUENCE_RATE_BURST_{name}", str(default_burst)))
+            limiter = _limiters[consumer] = RateLimiter(rate, burst)
+        return limiter
+
+
+def rate_limit_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {(consumer, k): v for consumer, limiter in limiters.items()
+            for k, v in limiter.stats().items() if isinstance(v, (int, float))}
+
+
+gauge('confluence_rate_limit', 'Client-side rate limiter towards Confluence, per consumer',
+      ('consumer', 'field'), fn=rate_limit_stats)
+
+
+class ConfluenceRetry(Retry):
+    # A POST that hit a 5xx may already have created the user/space/group,
+    # so only retry it when Confluence said it didn't process it (429).
+    # Every retry waits for the consumer's rate limiter like the first try.
+    def __init__(self, *args, limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.limiter = self.limiter
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST' and status_code != 429:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        # a retry is one more request towards Confluence, it needs a token too
+        if self.limiter:
+            self.limiter.acquire()
+
+
+class TimeoutSession(requests.Session):
+    def __init__(self, timeout, limiter=None):
+        super().__init__()
+        self.timeout = timeout
+        self.limiter = limiter
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            resp = super().request(method, url, **kwargs)
+            status = resp.status_code
+            return resp
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method=method.upper(),
+                                endpoint=endpoint_label(urlsplit(url).path), status=status)
+
+
+class ConfluenceClient:
+    def __init__(self, url, username=None, password=None, auth=None, pool_size=POOL_SIZE, timeout=TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, consumer='default'):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        limiter = rate_limiter(consumer)
+        self.session = TimeoutSession(timeout, limiter)
+        # auth (e.g. VaultAuth) is asked for credentials on every request, so a rotated password is picked up
+        self.session.auth = auth or (username, password)
+        self.session.headers.update({"Accept": "application/json"})
+        retry = ConfluenceRetry(
+            total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD', 'PUT', 'POST', 'DELETE']),
+            respect_retry_after_header=True, raise_on_status=False, limiter=limiter
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # no username/password here, the wrapper would replace session.auth with them
+        self.confluence = Confluence(url=self.url, session=self.session, timeout=timeout)
+
+    def request(self, method, path, **kwargs):
+        return self.session.request(method, f"{self.url}{path}", **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(url, username=None, password=None, auth=None, consumer='default', **kwargs):
+    key = (url.rstrip('/'), auth or (username, password), consumer)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = ConfluenceClient(url, username, password, auth=auth, consumer=consumer, **kwargs)
+            logger.info(f"Confluence client for {key[0]} as {username or type(auth).__name__} ({consumer})")
+        return client
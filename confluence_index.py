@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_TTL = float(os.getenv('MEMBERSHIP_TTL', '300'))
+PERMISSION_TTL = float(os.getenv('PERMISSION_TTL', '300'))
+
+
+class TTLIndex:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.counts = {'lookups': 0, 'loads': 0}
+
+    def lookup(self, key, load):
+        with self.lock:
+            self.counts['lookups'] += 1
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                return entry[0]
+            load_lock = self.loading.setdefault(key, threading.Lock())
+        # one thread downloads, the others wait for its result
+        with load_lock:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and time.monotonic() - entry[1] < self.ttl:
+                    return entry[0]
+            value = load(key)
+            with self.lock:
+                self.entries[key] = (value, time.monotonic())
+                self.counts['loads'] += 1
+            return value
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+class GroupMembershipIndex(TTLIndex):
+    def __init__(self, confluence, ttl=MEMBERSHIP_TTL, page_size=200):
+        super().__init__(ttl)
+        self.confluence = confluence
+        self.page_size = page_size
+
+    def members(self, group):
+        return self.lookup(group, self.fetch)
+
+    def fetch(self, group):
+        names = set()
+        start = 0
+        while True:
+            res = self.confluence.get_group_members(group, start=start, limit=self.page_size)
+            links = None
+            # newer atlassian-python-api returns the raw page instead of its results
+            if isinstance(res, dict):
+                links = res.get('_links')
+                res = res.get('results', [])
+            names.update(m['username'] for m in res if m.get('username'))
+            # the server may cap the limit, so a short page isn't the end; the
+            # next link is, or without links an empty page
+            if not res or (links is not None and 'next' not in links):
+                break
+            start += len(res)
+        logger.info(f"Loaded {len(names)} members of {group}")
+        return names
+
+    def contains(self, group, username):
+        return username in self.members(group)
+
+    def added(self, group, username):
+        with self.lock:
+            entry = self.entries.get(group)
+            if entry:
+                entry[0].add(username)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'groups': {g: len(e[0]) for g, e in self.entries.items()}}
+
+
+class SpacePermissionIndex(TTLIndex):
+    def __init__(self, confluence, ttl=PERMISSION_TTL):
+        super().__init__(ttl)
+        self.confluence = confluence
+        self.user_keys = {}
+
+    def fetch(self, space_key):
+        # (operation, subject type) -> user keys / group names holding it
+        index = {}
+        for p in self.confluence.get_all_space_permissions(space_key) or []:
+            op = p.get('operation', {}).get('operationKey')
+            subject = p.get('subject', {})
+            if subject.get('userKey'):
+                index.setdefault((op, 'user'), set()).add(subject['userKey'])
+            elif subject.get('name') or subject.get('identifier'):
+                index.setdefault((op, 'group'), set()).add(subject.get('name') or subject.get('identifier'))
+        return index
+
+    def holders(self, space_key, operation, subject_type='user'):
+        return self.lookup(space_key, self.fetch).get((operation, subject_type), set())
+
+    def user_key(self, username):
+        # user keys never change, no need to expire them
+        if username not in self.user_keys:
+            details = self.confluence.get_user_details_by_username(username)
+            self.user_keys[username] = details.get('userKey')
+        return self.user_keys[username]
+
+    def is_admin(self, space_key, username):
+        return self.user_key(username) in self.holders(space_key, 'administer')
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'spaces': len(self.entries), 'users': len(self.user_keys)}
+
+
+_memberships = {}
+_permissions = {}
+_lock = threading.Lock()
+
+
+def membership_index(client):
+    # one index per shared ConfluenceClient, so all managers see the same sets
+    with _lock:
+        if client not in _memberships:
+            _memberships[client] = GroupMembershipIndex(client.confluence)
+        return _memberships[client]
+
+
+def permission_index(client):
+    with _lock:
+        if client not in _permissions:
+            _permissions[client] = SpacePermissionIndex(client.confluence)
+        return _permissions[client]
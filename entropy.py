@@ -0,0 +1,151 @@
+import os
+import string
+import numpy as np
+
+# Second stage for the scanner: random-looking tokens that none of the
+# PATTERNS know about (internal service tokens etc.). Long runs of token
+# characters are found from a translated copy of the page, then scored in
+# batches with NumPy from the character counts of each token, so there is
+# no per-token or per-character Python loop.
+
+MIN_LENGTH = int(os.getenv('ENTROPY_MIN_LENGTH', '20'))
+# longer runs are embedded blobs, not credentials
+MAX_LENGTH = int(os.getenv('ENTROPY_MAX_LENGTH', '256'))
+# bits per character; random hex tops out at 4, random base64 at 6
+THRESHOLDS = {
+    'hex': float(os.getenv('ENTROPY_HEX_THRESHOLD', '3.0')),
+    'base64': float(os.getenv('ENTROPY_BASE64_THRESHOLD', '4.2')),
+}
+# hex runs this long are git commits and SHA-256 checksums, not credentials
+SKIP_HEX_LENGTHS = tuple(int(n) for n in os.getenv('ENTROPY_SKIP_HEX_LENGTHS', '40,64').split(',') if n.strip())
+# 8-4-4-4-12 hex: page, macro and content ids all over Confluence storage format
+UUID_DASHES = [8, 13, 18, 23]
+UUID_HEX = [i for i in range(36) if i not in UUID_DASHES]
+TYPES = {'hex': 'High Entropy Hex', 'base64': 'High Entropy Base64'}
+BATCH = 4096
+
+# base64 and its url-safe variant; '=' only as padding at the end. '/' splits
+# tokens, or every URL and file path would be one long mixed token.
+TOKEN_CHARS = string.ascii_letters + string.digits + '+_-'
+
+
+def lookup(chars):
+    table = np.zeros(256, dtype=bool)
+    table[list(chars.encode())] = True
+    return table
+
+
+# bytes.translate table: 1 for token characters, 0 for everything else
+IN_TOKEN = bytes(lookup(TOKEN_CHARS))
+IS_HEX = lookup(string.hexdigits)
+IS_DIGIT = lookup(string.digits)
+IS_LETTER = lookup(string.ascii_letters)
+
+
+def codes(text):
+    # one byte per character so positions match the str; anything
+    # non-ASCII becomes 255, which no token contains
+    if text.isascii():
+        return text.encode('ascii')
+    return np.minimum(np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32), 255).astype(np.uint8).tobytes()
+
+
+def entropies(data, lengths):
+    # Shannon entropy of each token; data is every token's bytes back to back.
+    # Sorting token*256+byte puts equal characters of a token next to each
+    # other, so the counts come from run lengths and the work follows the
+    # bytes scanned instead of a 256-wide histogram per token.
+    n = len(lengths)
+    if not n:
+        return np.zeros(0)
+    keys = np.sort(np.repeat(np.arange(n, dtype=np.int32) * 256, lengths) + data)
+    runs = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.diff(np.append(runs, len(keys)))
+    rows = keys[runs] >> 8
+    p = counts / lengths[rows]
+    return -np.bincount(rows, weights=p * np.log2(p), minlength=n)
+
+
+def token_runs(mask, min_length):
+    # start and end of the runs of 1s in mask that could be min_length long.
+    # Such a run covers a whole aligned block of `width` bytes, so only the
+    # blocks are compared (8 at a time as one uint64) and each group of full
+    # blocks is widened to its run from the block on either side. Prose gets
+    # through with almost no work, and a page full of ids without a Python
+    # loop over the runs, which costs more than scoring them.
+    width = 8 if min_length >= 15 else 4 if min_length >= 7 else 2 if min_length >= 3 else 1
+    dtype = {8: np.uint64, 4: np.uint32, 2: np.uint16, 1: np.uint8}[width]
+    # a block of 0s at both ends, so every group has a block before and after it
+    padded = b'\0' * width + mask + b'\0' * (width + -len(mask) % width)
+    full = np.frombuffer(padded, dtype=dtype) == int.from_bytes(b'\1' * width, 'little')
+    edges = np.flatnonzero(full[1:] != full[:-1]) + 1
+    first, last = edges[::2], edges[1::2] - 1
+    blocks = np.frombuffer(padded, dtype=np.uint8).reshape(-1, width)
+    starts = first * width - np.argmin(blocks[first - 1, ::-1], axis=1) - width
+    ends = (last + 1) * width + np.argmin(blocks[last + 1], axis=1) - width
+    return starts, ends
+
+
+class EntropyDetector:
+    def __init__(self, thresholds=THRESHOLDS, min_length=MIN_LENGTH, max_length=MAX_LENGTH, batch=BATCH,
+                 skip_hex_lengths=SKIP_HEX_LENGTHS):
+        self.thresholds = {**THRESHOLDS, **thresholds}
+        self.min_length = min_length
+        self.max_length = max_length
+        self.batch = batch
+        self.skip_hex_lengths = sorted(skip_hex_lengths)
+        self.types = [TYPES['hex'], TYPES['base64']]
+
+    def settings(self):
+        return {'thresholds': self.thresholds, 'min_length': self.min_length, 'max_length': self.max_length,
+                'skip_hex_lengths': self.skip_hex_lengths}
+
+    def scan(self, content, pos=0, endpos=None):
+        # tokens starting in [pos, endpos); the text is only looked at far
+        # enough past endpos to tell whether the last token is too long
+        if endpos is None:
+            endpos = len(content)
+        raw = codes(content[pos:min(len(content), endpos + self.max_length + 3)])
+        starts, ends = token_runs(raw.translate(IN_TOKEN), self.min_length)
+        lengths = ends - starts
+        # skip short runs, blobs, and a token the window starts in the middle of
+        keep = (lengths >= self.min_length) & (lengths <= self.max_length) & (starts < endpos - pos)
+        if pos and content[pos - 1] in TOKEN_CHARS:
+            keep &= starts > 0
+        starts, ends, lengths = starts[keep], ends[keep], lengths[keep]
+        arr = np.frombuffer(raw + b'\0\0', dtype=np.uint8)
+        # commit hashes, checksums and UUIDs are dropped before any scoring;
+        # only the few runs of exactly their length are looked at
+        skip = np.zeros(len(starts), dtype=bool)
+        for length in self.skip_hex_lengths:
+            ids = np.flatnonzero(lengths == length)
+            skip[ids[IS_HEX[arr[starts[ids, None] + np.arange(length)]].all(axis=1)]] = True
+        ids = np.flatnonzero(lengths == 36)
+        block = arr[starts[ids, None] + np.arange(36)]
+        skip[ids[(block[:, UUID_DASHES] == ord('-')).all(axis=1) & IS_HEX[block[:, UUID_HEX]].all(axis=1)]] = True
+        starts, ends, lengths = starts[~skip], ends[~skip], lengths[~skip]
+        if not len(starts):
+            return []
+        # up to two '=' of padding belong to the token, not to its entropy
+        pad = arr[ends] == ord('=')
+        padded = ends + pad + (pad & (arr[ends + 1] == ord('=')))
+
+        found = []
+        for i in range(0, len(starts), self.batch):
+            for n, is_hex in self.check(arr, starts[i:i + self.batch], lengths[i:i + self.batch]):
+                start, end = pos + int(starts[i + n]), pos + int(padded[i + n])
+                found.append({'type': TYPES['hex'] if is_hex else TYPES['base64'],
+                              'text': content[start:end], 'start': start, 'end': end})
+        return found
+
+    def check(self, arr, starts, lengths):
+        offsets = np.cumsum(lengths) - lengths
+        data = arr[np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())]
+
+        is_hex = np.logical_and.reduceat(IS_HEX[data], offsets)
+        # plain words and long numbers are never tokens
+        mixed = np.logical_or.reduceat(IS_DIGIT[data], offsets) & np.logical_or.reduceat(IS_LETTER[data], offsets)
+        limit = np.where(is_hex, self.thresholds['hex'], self.thresholds['base64'])
+        hits = np.flatnonzero(mixed & (entropies(data, lengths) >= limit))
+        return [(n, bool(is_hex[n])) for n in hits]
+
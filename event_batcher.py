@@ -0,0 +1,125 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def room_name(req_type=None, space=None):
+    # every client sits in exactly one of these, so nobody gets a change twice
+    return f"requests:{req_type or '*'}:{(space or '*').upper()}"
+
+
+class EventBatcher:
+    # Collects request changes and sends them every `interval` seconds as one
+    # `requests_batch` per room: new requests in full, updates as only the
+    # fields that differ from what was last sent for that request (the last
+    # `remember` requests are kept). Several updates to one request inside a
+    # window go out as one, and bulk progress only sends the latest count per import.
+    def __init__(self, socketio, interval=0.25, scope=None, remember=10000):
+        self.socketio = socketio
+        self.interval = interval
+        self.remember = remember
+        # req -> (type, space key), for picking the rooms a change goes to
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self.progress = OrderedDict()
+        self.finished = []
+        self.scheduled = False
+        # request id -> the fields as the clients last got them
+        self.sent = OrderedDict()
+        self.counts = {'events': 0, 'coalesced': 0, 'unchanged': 0, 'flushes': 0, 'emits': 0}
+
+    def rooms(self, req):
+        req_type, space = self.scope(req)
+        return list(dict.fromkeys([room_name(), room_name(req_type), room_name(space=space), room_name(req_type, space)]))
+
+    def created(self, req):
+        with self.lock:
+            self.counts['events'] += 1
+            self.pending[req['id']] = {'created': True, 'fields': dict(req), 'rooms': self.rooms(req)}
+            self._schedule()
+
+    def updated(self, req, changed):
+        fields = {k: req.get(k) for k in changed}
+        with self.lock:
+            self.counts['events'] += 1
+            entry = self.pending.get(req['id'])
+            if entry:
+                entry['fields'].update(fields)
+                self.counts['coalesced'] += 1
+            else:
+                self.pending[req['id']] = {'created': False, 'fields': {'id': req['id'], **fields}, 'rooms': self.rooms(req)}
+            self._schedule()
+
+    def bulk_progress(self, event):
+        with self.lock:
+            self.counts['events'] += 1
+            if event['bulk_id'] in self.progress:
+                self.counts['coalesced'] += 1
+            self.progress[event['bulk_id']] = event
+            self._schedule()
+
+    def bulk_completed(self, summary):
+        with self.lock:
+            self.counts['events'] += 1
+            self.finished.append(summary)
+            self._schedule()
+
+    def _schedule(self):
+        # the first change in a window starts the timer; called with the lock held
+        if not self.scheduled:
+            self.scheduled = True
+            self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        self.socketio.sleep(self.interval)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Sending dashboard events failed: {e}")
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+            progress, self.progress = self.progress, OrderedDict()
+            finished, self.finished = self.finished, []
+            self.scheduled = False
+            changes = [entry for rid, entry in pending.items() if self._diff(rid, entry)]
+        batches = {}
+        for entry in changes:
+            for room in entry['rooms']:
+                batch = batches.setdefault(room, {'created': [], 'updated': []})
+                batch['created' if entry['created'] else 'updated'].append(entry['fields'])
+        for room, batch in batches.items():
+            self.socketio.emit('requests_batch', batch, to=room)
+        for event in progress.values():
+            self.socketio.emit('bulk_progress', event)
+        for summary in finished:
+            self.socketio.emit('bulk_completed', summary)
+        with self.lock:
+            self.counts['flushes'] += 1
+            self.counts['emits'] += len(batches) + len(progress) + len(finished)
+
+    def _diff(self, rid, entry):
+        # drops the fields the clients already have and remembers the rest;
+        # False when nothing is left to send. Called with the lock held.
+        last = self.sent.get(rid)
+        if last is not None and not entry['created']:
+            entry['fields'] = {k: v for k, v in entry['fields'].items() if k == 'id' or k not in last or last[k] != v}
+            if len(entry['fields']) == 1:
+                self.counts['unchanged'] += 1
+                return False
+        if last is None or entry['created']:
+            last = self.sent[rid] = {}
+        last.update(entry['fields'])
+        self.sent.move_to_end(rid)
+        while len(self.sent) > self.remember:
+            self.sent.popitem(last=False)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'pending': len(self.pending) + len(self.progress) + len(self.finished),
+                    'interval_ms': int(self.interval * 1000)}
@@ -0,0 +1,219 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from allowlist import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# next to the code, not in /tmp where any local user can read or replace it
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'findings.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    id INTEGER PRIMARY KEY,
+    found_at INTEGER NOT NULL,
+    page_id TEXT NOT NULL,
+    space_key TEXT NOT NULL,
+    version INTEGER,
+    attachment_id TEXT,
+    type TEXT NOT NULL,
+    fingerprint BLOB NOT NULL
+);
+-- rows go in in time order, so the rowid every index carries is time order too
+CREATE INDEX IF NOT EXISTS idx_findings_space ON findings(space_key);
+CREATE INDEX IF NOT EXISTS idx_findings_type ON findings(type);
+CREATE INDEX IF NOT EXISTS idx_findings_page ON findings(page_id);
+CREATE INDEX IF NOT EXISTS idx_findings_time ON findings(found_at);
+CREATE TABLE IF NOT EXISTS findings_daily (
+    day TEXT NOT NULL,
+    space_key TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, space_key, type)
+) WITHOUT ROWID;
+"""
+
+# One row per secret per page (or attachment) version, however often it is
+# seen: reruns, retried webhooks and rescans after an allowlist reload. NULLs
+# never clash in a unique index, hence the IFNULLs.
+UNIQUE_KEY = "page_id, IFNULL(version, -1), IFNULL(attachment_id, ''), type, fingerprint"
+DEDUPE = [
+    f"DELETE FROM findings WHERE id NOT IN (SELECT MIN(id) FROM findings GROUP BY {UNIQUE_KEY})",
+    "DELETE FROM findings_daily",
+    "INSERT INTO findings_daily (day, space_key, type, count) "
+    "SELECT strftime('%Y-%m-%d', found_at, 'unixepoch'), space_key, type, COUNT(*) FROM findings GROUP BY 1, 2, 3",
+    f"CREATE UNIQUE INDEX idx_findings_unique ON findings({UNIQUE_KEY})",
+]
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+
+class FindingsLedger:
+    # Every finding the scanner reports, as a fingerprint (never the secret),
+    # appended by one writer thread in batched transactions. Per day/space/type
+    # counts are kept up to date in findings_daily as rows go in, so the
+    # aggregate queries read that small table instead of scanning findings.
+    def __init__(self, path, batch=500, interval=1.0, maxsize=100000):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self.q = queue.Queue(maxsize=maxsize)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {'written': 0, 'duplicates': 0, 'dropped': 0, 'batches': 0, 'failed': 0, 'no_key': 0}
+        self.last_batch_ms = 0.0
+        self.conn().executescript(SCHEMA)
+        self.migrate()
+        self.thread = threading.Thread(target=self._writer, name="findings-ledger", daemon=True)
+        self.thread.start()
+
+    def conn(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            # keeps the index pages the writer keeps touching in memory
+            db.execute("PRAGMA cache_size=-65536")
+            self.local.db = db
+        return db
+
+    def migrate(self):
+        # ledgers from before the unique index: drop the repeats and recount
+        db = self.conn()
+        if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_findings_unique'").fetchone():
+            return
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in DEDUPE:
+                db.execute(sql)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        logger.info(f"Findings ledger {self.path} deduplicated")
+
+    def record(self, page_id, space_key, version, secrets, attachment_id=None):
+        # called from the scan workers; never blocks them on the disk
+        now = int(time.time())
+        for sec in secrets:
+            try:
+                digest = bytes.fromhex(fingerprint(sec['type'], sec['text']))
+            except RuntimeError as e:
+                # no key, nothing written: rows under another key would never dedupe
+                with self.lock:
+                    self.counts['no_key'] += len(secrets)
+                logger.error(f"Findings not recorded for page {page_id}: {e}")
+                return
+            row = (now, str(page_id), (space_key or '').upper(), version, attachment_id, sec['type'], digest)
+            try:
+                self.q.put_nowait(row)
+            except queue.Full:
+                with self.lock:
+                    self.counts['dropped'] += 1
+
+    def _writer(self):
+        while True:
+            rows = [self.q.get()]
+            deadline = time.monotonic() + self.interval
+            while len(rows) < self.batch:
+                try:
+                    rows.append(self.q.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self.write(rows)
+            except Exception as e:
+                logger.error(f"Could not write {len(rows)} findings: {e}")
+                with self.lock:
+                    self.counts['failed'] += len(rows)
+            finally:
+                for _ in rows:
+                    self.q.task_done()
+
+    def write(self, rows):
+        start = time.perf_counter()
+        daily = {}
+        inserted = 0
+        db = self.conn()
+        db.execute("BEGIN")
+        try:
+            for row in rows:
+                # only what is new counts towards the daily totals
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO findings (found_at, page_id, space_key, version, attachment_id, type, fingerprint) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                if cur.rowcount:
+                    key = (day_of(row[0]), row[2], row[5])
+                    daily[key] = daily.get(key, 0) + 1
+                    inserted += 1
+            db.executemany(
+                "INSERT INTO findings_daily (day, space_key, type, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (day, space_key, type) DO UPDATE SET count = count + excluded.count",
+                [(*key, n) for key, n in daily.items()])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        with self.lock:
+            self.counts['written'] += inserted
+            self.counts['duplicates'] += len(rows) - inserted
+            self.counts['batches'] += 1
+            self.last_batch_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def flush(self, timeout=10):
+        # wait for what's queued to be on disk (shutdown, tests)
+        done = threading.Event()
+        threading.Thread(target=lambda: (self.q.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def summary(self, days=30, space_key=None, secret_type=None, top=10):
+        since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        where, args = ["day >= ?"], [since]
+        if space_key:
+            where.append("space_key = ?")
+            args.append(space_key.upper())
+        if secret_type:
+            where.append("type = ?")
+            args.append(secret_type)
+        cond = " AND ".join(where)
+        db = self.conn()
+        top_spaces = db.execute(
+            f"SELECT space_key, SUM(count) AS n FROM findings_daily WHERE {cond} "
+            f"GROUP BY space_key ORDER BY n DESC LIMIT ?", (*args, top)).fetchall()
+        trend = db.execute(
+            f"SELECT day, type, SUM(count) AS n FROM findings_daily WHERE {cond} GROUP BY day, type ORDER BY day",
+            args).fetchall()
+        by_type = {}
+        for r in trend:
+            by_type[r['type']] = by_type.get(r['type'], 0) + r['n']
+        return {
+            'since': since,
+            'total': sum(by_type.values()),
+            'top_spaces': [{'space_key': r['space_key'], 'count': r['n']} for r in top_spaces],
+            'by_type': [{'type': t, 'count': n} for t, n in sorted(by_type.items(), key=lambda x: -x[1])],
+            'trend': [{'day': r['day'], 'type': r['type'], 'count': r['n']} for r in trend]
+        }
+
+    def recent(self, limit=50, space_key=None, secret_type=None, page_id=None):
+        where, args = [], []
+        for col, value in (('space_key', space_key.upper() if space_key else None), ('type', secret_type), ('page_id', page_id)):
+            if value:
+                where.append(f"{col} = ?")
+                args.append(value)
+        cond = f"WHERE {' AND '.join(where)}" if where else ""
+        rows = self.conn().execute(
+            f"SELECT found_at, page_id, space_key, version, attachment_id, type, fingerprint FROM findings {cond} "
+            f"ORDER BY id DESC LIMIT ?", (*args, limit)).fetchall()
+        return [{**dict(r), 'fingerprint': r['fingerprint'].hex()} for r in rows]
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'queued': self.q.qsize(), 'last_batch_ms': self.last_batch_ms}
@@ -0,0 +1,224 @@
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request
+
+# seconds, from a fast cache hit up to a slow Confluence call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def label_text(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{label_text(self.labels, k)} {v}" for k, v in items]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        # fn is read at scrape time; returns a number, or {label value tuple: number}
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def render(self):
+        if self.fn:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+            with self.lock:
+                self.values = dict(value) if isinstance(value, dict) else {(): value}
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self.lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self.values.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                lines.append(f"{self.name}_bucket{label_text(self.labels, key, ('le', bound))} {running}")
+            lines.append(f"{self.name}_bucket{label_text(self.labels, key, ('le', '+Inf'))} {n}")
+            lines.append(f"{self.name}_sum{label_text(self.labels, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{label_text(self.labels, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get(self, cls, name, *args, **kwargs):
+        # same name twice gives back the same metric, so modules can declare what they use
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def stats(self, prefix, fn, help):
+        # every number in an existing stats() dict becomes a gauge
+        def values():
+            return {(k,): v for k, v in fn().items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        return self.get(Gauge, prefix, help, ('field',), fn=values)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for m in metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.get(Counter, name, help, labels)
+
+
+def gauge(name, help, labels=(), fn=None):
+    return REGISTRY.get(Gauge, name, help, labels, fn=fn)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.get(Histogram, name, help, labels, buckets=buckets)
+
+
+FUNCTION_SECONDS = histogram('function_seconds', 'Time spent in instrumented functions', ('function',))
+
+
+def timed(fn=None, metric=None, **labels):
+    # @timed on a hot path records its duration in function_seconds{function=...}
+    def wrap(f):
+        target = metric or FUNCTION_SECONDS
+        names = labels if metric else {'function': f"{f.__module__}.{f.__qualname__}"}
+
+        @functools.wraps(f)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                target.observe(time.perf_counter() - start, **names)
+        return inner
+    return wrap(fn) if fn else wrap
+
+
+ID_SEGMENTS = [
+    (re.compile(r'^/rest/api/content/\d+'), '/rest/api/content/{id}'),
+    (re.compile(r'^/rest/api/group/[^/]+/member'), '/rest/api/group/{group}/member'),
+    (re.compile(r'^/rest/api/user/[^/]+/group/[^/]+'), '/rest/api/user/{user}/group/{group}'),
+    (re.compile(r'^/rest/api/space/[^/]+/permissions/group/[^/]+/grant'), '/rest/api/space/{key}/permissions/group/{group}/grant'),
+    (re.compile(r'^/rest/api/space/[^/]+'), '/rest/api/space/{key}'),
+    (re.compile(r'^/download/attachments/.*'), '/download/attachments/{id}/{name}'),
+]
+
+
+def endpoint_label(path):
+    # keep page ids, group names and space keys out of the labels
+    path = path.split('?', 1)[0]
+    for pattern, template in ID_SEGMENTS:
+        match = pattern.match(path)
+        if match:
+            return template + path[match.end():]
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+
+def flask_metrics(app, name):
+    # request latency per route, plus the /metrics endpoint itself
+    seconds = histogram('http_request_seconds', 'Time to answer HTTP requests', ('app', 'method', 'route', 'status'))
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record(response):
+        start = getattr(g, 'metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            seconds.observe(time.perf_counter() - start, app=name, method=request.method, route=route,
+                            status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return REGISTRY.render(), 200, {'Content-Type': CONTENT_TYPE}
@@ -0,0 +1,354 @@
+import argparse
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class MockSecret:
+    # stands in for Vault when talking to the mock
+    def __init__(self, username='admin', password='admin'):
+        self.username = username
+        self.password = password
+
+    def read_confluence_secret(self):
+        return self.username, self.password, None, 1
+
+    def read_fingerprint_key(self):
+        return 'mock-fingerprint-key'
+
+
+class MockConfluence:
+    # Just enough of the Confluence Server REST API for our scripts, kept in memory.
+    # latency/jitter (seconds) are added to every /rest call, failure_rate of them
+    # answer failure_status instead.
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503, seed=None,
+                 credentials=('admin', 'admin')):
+        self.credentials = credentials
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+        self.app = Flask(__name__)
+        self.routes()
+        self.server = None
+
+    def reset(self):
+        with self.lock:
+            self.pages = {}
+            self.history = {}
+            self.attachments = {}
+            self.users = {'admin': {'username': 'admin', 'userKey': 'key-admin', 'displayName': 'Admin'}}
+            self.groups = {'confluence-users': {'admin'}, 'confluence-administrators': {'admin'}}
+            self.spaces = {}
+            self.webhooks = []
+            self.next_id = 1000
+            self.calls = Counter()
+            self.failures = 0
+            self.on_put = None
+
+    # ---- seeding helpers, used by the benchmark ----
+
+    def add_page(self, space_key, title, body):
+        with self.lock:
+            self.next_id += 1
+            page_id = str(self.next_id)
+            self.pages[page_id] = {'id': page_id, 'type': 'page', 'title': title, 'space': space_key,
+                                   'version': {'number': 1, 'message': ''}, 'body': body}
+            self.history[page_id] = {1: body}
+            return page_id
+
+    def edit_page(self, page_id, body, fire=True):
+        # an edit made by a person: bumps the version and sends the page_updated webhook
+        with self.lock:
+            page = self.pages[page_id]
+            page['version'] = {'number': page['version']['number'] + 1, 'message': ''}
+            page['body'] = body
+            self.history[page_id][page['version']['number']] = body
+            version = page['version']['number']
+        if fire:
+            self.fire('page_updated', {'page': {'id': page_id, 'version': version}})
+        return version
+
+    def add_attachment(self, page_id, title, data, media_type='text/plain'):
+        with self.lock:
+            self.next_id += 1
+            self.attachments.setdefault(page_id, []).append({
+                'id': f"att{self.next_id}", 'title': title, 'version': {'number': 1},
+                'metadata': {'mediaType': media_type}, 'extensions': {'fileSize': len(data)},
+                '_links': {'download': f"/download/attachments/{page_id}/{title}"}, 'data': data
+            })
+
+    def add_user(self, username, licensed=True):
+        with self.lock:
+            self.users[username] = {'username': username, 'userKey': f"key-{username}", 'displayName': username}
+            if licensed:
+                self.groups['confluence-users'].add(username)
+
+    def add_space(self, key, name=None, admins=('admin',)):
+        with self.lock:
+            self.spaces[key] = {'key': key, 'name': name or key, 'permissions': [
+                {'operation': {'operationKey': 'administer', 'targetType': 'space'},
+                 'subject': {'type': 'user', 'userKey': self.users[u]['userKey']}} for u in admins
+            ]}
+
+    def fire(self, event, payload):
+        with self.lock:
+            hooks = [h for h in self.webhooks if event in h['events'] and h.get('active', True)]
+        for hook in hooks:
+            try:
+                requests.post(hook['url'], json=payload, timeout=10)
+            except Exception as e:
+                logger.warning(f"Webhook {hook['url']} failed: {e}")
+
+    # ---- REST API ----
+
+    def routes(self):
+        app = self.app
+
+        @app.before_request
+        def inject():
+            if not request.path.startswith('/rest'):
+                return None
+            auth = request.authorization
+            if not auth or (auth.username, auth.password) != tuple(self.credentials):
+                return jsonify({'message': 'Unauthorized'}), 401
+            with self.lock:
+                self.calls[f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"] += 1
+                fail = self.failure_rate and self.rng.random() < self.failure_rate
+                delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0.0)
+                if fail:
+                    self.failures += 1
+            if delay:
+                time.sleep(delay)
+            if fail:
+                return jsonify({'message': 'injected failure'}), self.failure_status
+            return None
+
+        @app.route('/rest/api/content/<page_id>', methods=['GET'])
+        def get_page(page_id):
+            with self.lock:
+                page = self.pages.get(page_id)
+                if not page:
+                    return jsonify({'message': 'No content found'}), 404
+                body = page['body']
+                version = dict(page['version'])
+                if request.args.get('status') == 'historical' and request.args.get('version'):
+                    version = {'number': int(request.args['version']), 'message': ''}
+                    body = self.history[page_id].get(version['number'])
+                    if body is None:
+                        return jsonify({'message': 'No such version'}), 404
+                return jsonify({'id': page_id, 'type': 'page', 'title': page['title'], 'version': version,
+                                'space': {'key': page['space']},
+                                'body': {'storage': {'value': body, 'representation': 'storage'}}})
+
+        @app.route('/rest/api/content/<page_id>', methods=['PUT'])
+        def put_page(page_id):
+            data = request.json
+            with self.lock:
+                page = self.pages.get(page_id)
+                if not page:
+                    return jsonify({'message': 'No content found'}), 404
+                number = data['version']['number']
+                if number != page['version']['number'] + 1:
+                    return jsonify({'message': 'Version conflict'}), 409
+                page['version'] = {'number': number, 'message': data['version'].get('message', '')}
+                page['title'] = data.get('title', page['title'])
+                page['body'] = data['body']['storage']['value']
+                self.history[page_id][number] = page['body']
+                on_put = self.on_put
+            if on_put:
+                on_put(page_id, number)
+            return jsonify({'id': page_id, 'version': {'number': number}})
+
+        @app.route('/rest/api/content', methods=['GET'])
+        def list_content():
+            start = int(request.args.get('start', 0))
+            limit = int(request.args.get('limit', 25))
+            space = request.args.get('spaceKey')
+            with self.lock:
+                ids = [i for i, p in self.pages.items() if not space or p['space'] == space]
+                results = []
+                for i in ids[start:start + limit]:
+                    p = self.pages[i]
+                    results.append({'id': i, 'type': 'page', 'title': p['title'], 'version': dict(p['version']),
+                                    'body': {'storage': {'value': p['body'], 'representation': 'storage'}}})
+            links = {'next': 'more'} if start + limit < len(ids) else {}
+            return jsonify({'results': results, 'start': start, 'limit': limit, 'size': len(results), '_links': links})
+
+        @app.route('/rest/api/content/<page_id>/child/attachment', methods=['GET'])
+        def list_attachments(page_id):
+            start = int(request.args.get('start', 0))
+            # like Confluence, fewer than asked for when the limit is over its cap
+            limit = min(int(request.args.get('limit', 25)), 50)
+            with self.lock:
+                all_atts = self.attachments.get(page_id, [])
+                results = [{k: v for k, v in a.items() if k != 'data'} for a in all_atts[start:start + limit]]
+                links = {'next': 'more'} if start + limit < len(all_atts) else {}
+            return jsonify({'results': results, 'start': start, 'limit': limit, 'size': len(results), '_links': links})
+
+        @app.route('/download/attachments/<page_id>/<name>', methods=['GET'])
+        def download(page_id, name):
+            with self.lock:
+                att = next((a for a in self.attachments.get(page_id, []) if a['title'] == name), None)
+            if not att:
+                return jsonify({'message': 'Not found'}), 404
+            return att['data']
+
+        @app.route('/rest/api/space', methods=['GET'])
+        def list_spaces():
+            start = int(request.args.get('start', 0))
+            limit = min(int(request.args.get('limit', 25)), 50)
+            with self.lock:
+                keys = list(self.spaces)[start:start + limit]
+                results = [{'key': k, 'name': self.spaces[k]['name']} for k in keys]
+                links = {'next': 'more'} if start + limit < len(self.spaces) else {}
+            return jsonify({'results': results, 'start': start, 'limit': limit, 'size': len(results), '_links': links})
+
+        @app.route('/rest/api/space', methods=['POST'])
+        def create_space():
+            data = request.json
+            with self.lock:
+                if data['key'] in self.spaces:
+                    return jsonify({'message': 'A space with this key already exists'}), 400
+                self.spaces[data['key']] = {'key': data['key'], 'name': data.get('name', data['key']), 'permissions': [
+                    {'operation': {'operationKey': 'administer', 'targetType': 'space'},
+                     'subject': {'type': 'user', 'userKey': 'key-admin'}}
+                ]}
+            return jsonify({'key': data['key'], 'name': data.get('name')}), 200
+
+        @app.route('/rest/api/space/<key>/permissions', methods=['GET'])
+        def space_permissions(key):
+            with self.lock:
+                space = self.spaces.get(key)
+                if not space:
+                    return jsonify({'message': 'No space'}), 404
+                return jsonify(list(space['permissions']))
+
+        @app.route('/rest/api/space/<key>/permissions/group/<group>/grant', methods=['PUT'])
+        def grant(key, group):
+            with self.lock:
+                space = self.spaces.get(key)
+                if not space or group not in self.groups:
+                    return jsonify({'message': 'No space or group'}), 404
+                for perm in request.json or []:
+                    space['permissions'].append({'operation': perm, 'subject': {'type': 'group', 'name': group}})
+            return '', 204
+
+        @app.route('/rest/api/group/<group>/member', methods=['GET'])
+        def group_members(group):
+            start = int(request.args.get('start', 0))
+            limit = int(request.args.get('limit', 200))
+            with self.lock:
+                if group not in self.groups:
+                    return jsonify({'message': 'No group'}), 404
+                members = sorted(self.groups[group])
+                names = members[start:start + limit]
+            links = {'next': 'more'} if start + limit < len(members) else {}
+            return jsonify({'results': [{'type': 'known', 'username': n} for n in names], 'start': start,
+                            'limit': limit, 'size': len(names), '_links': links})
+
+        @app.route('/rest/api/group/<group>/member', methods=['POST'])
+        def add_member(group):
+            return self.add_member(group, (request.json or {}).get('name'))
+
+        @app.route('/rest/api/user/<username>/group/<group>', methods=['PUT'])
+        def add_member_legacy(username, group):
+            return self.add_member(group, username)
+
+        @app.route('/rest/api/admin/group', methods=['POST'])
+        def create_group():
+            name = request.json['name']
+            with self.lock:
+                if name in self.groups:
+                    return jsonify({'message': 'Group already exists'}), 400
+                self.groups[name] = set()
+            return jsonify({'name': name, 'type': 'group'}), 201
+
+        @app.route('/rest/api/user', methods=['GET'])
+        def get_user():
+            with self.lock:
+                user = self.users.get(request.args.get('username'))
+            if not user:
+                return jsonify({'message': 'No user found'}), 404
+            return jsonify({'type': 'known', **user})
+
+        @app.route('/rest/api/admin/user', methods=['POST'])
+        def create_user():
+            data = request.json
+            with self.lock:
+                if data['userName'] in self.users:
+                    return jsonify({'message': 'User exists'}), 400
+                self.users[data['userName']] = {'username': data['userName'], 'userKey': f"key-{data['userName']}",
+                                                'displayName': data.get('fullName')}
+            return jsonify({'username': data['userName']}), 201
+
+        @app.route('/rest/api/webhooks', methods=['GET'])
+        def list_webhooks():
+            with self.lock:
+                return jsonify(list(self.webhooks))
+
+        @app.route('/rest/api/webhooks', methods=['POST'])
+        def create_webhook():
+            with self.lock:
+                hook = {'id': len(self.webhooks) + 1, **request.json}
+                self.webhooks.append(hook)
+            return jsonify(hook), 201
+
+        @app.route('/mock/stats', methods=['GET'])
+        def stats():
+            with self.lock:
+                return jsonify({'calls': dict(self.calls), 'failures': self.failures, 'pages': len(self.pages),
+                                'users': len(self.users), 'groups': len(self.groups), 'spaces': len(self.spaces)})
+
+        @app.route('/mock/config', methods=['POST'])
+        def config():
+            for k in ('latency', 'jitter', 'failure_rate', 'failure_status'):
+                if k in request.json:
+                    setattr(self, k, request.json[k])
+            return jsonify({k: getattr(self, k) for k in ('latency', 'jitter', 'failure_rate', 'failure_status')})
+
+    def add_member(self, group, username):
+        with self.lock:
+            if group not in self.groups or username not in self.users:
+                return jsonify({'message': 'No group or user'}), 404
+            self.groups[group].add(username)
+        return '', 204
+
+    def start(self, host='127.0.0.1', port=0):
+        # threaded werkzeug server in the background, returns its base URL
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, name="mock-confluence", daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Local stand-in for the Confluence REST API")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every REST call")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--failure-status', type=int, default=503)
+    args = parser.parse_args()
+
+    mock = MockConfluence(args.latency, args.jitter, args.failure_rate, args.failure_status)
+    mock.add_space('DEMO', 'Demo space')
+    mock.add_page('DEMO', 'Runbook', '<p>password: hunter22</p>')
+    print(f"Mock Confluence on {mock.start('0.0.0.0', args.port)} (login admin/admin)")
+    threading.Event().wait()
@@ -0,0 +1,332 @@
+import abc
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    space_key TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status, id);
+CREATE INDEX IF NOT EXISTS idx_requests_type ON requests(type, id);
+CREATE INDEX IF NOT EXISTS idx_requests_space ON requests(space_key, id);
+CREATE INDEX IF NOT EXISTS idx_requests_updated ON requests(updated_at);
+UPDATE requests SET updated_at = created_at WHERE updated_at IS NULL;
+"""
+
+
+def request_type(doc):
+    return doc.get('type', 'access_request')
+
+
+class RequestStore(abc.ABC):
+    @abc.abstractmethod
+    def create(self, doc):
+        pass
+
+    @abc.abstractmethod
+    def get(self, rid):
+        pass
+
+    @abc.abstractmethod
+    def update(self, rid, **fields):
+        # returns (previous status, updated request) or None
+        pass
+
+    @abc.abstractmethod
+    def list(self, status=None):
+        pass
+
+    @abc.abstractmethod
+    def page(self, limit=50, before=None, since=None, status=None, req_type=None, space_key=None,
+             created_from=None, created_to=None, since_id=None):
+        # newest first, cursor is the last id; with since, changes oldest first by
+        # (updated_at, id), after since_id when requests share the timestamp
+        pass
+
+    @abc.abstractmethod
+    def counts(self):
+        pass
+
+
+class SQLiteRequestStore(RequestStore):
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.conn().executescript(SCHEMA)
+
+    def conn(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def row_to_doc(self, row):
+        return {'id': row['id'], **json.loads(row['doc'])}
+
+    def insert(self, db, doc, rid=None):
+        body = {k: v for k, v in doc.items() if k != 'id'}
+        cur = db.execute(
+            "INSERT INTO requests (id, type, status, space_key, created_at, updated_at, doc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (rid, request_type(doc), doc['status'], (doc.get('data') or {}).get('space_key'),
+             doc['created_at'], doc.get('updated_at') or doc['created_at'], json.dumps(body))
+        )
+        return cur.lastrowid
+
+    def create(self, doc):
+        rid = self.insert(self.conn(), doc)
+        return {'id': rid, **doc}
+
+    def get(self, rid):
+        row = self.conn().execute("SELECT id, doc FROM requests WHERE id = ?", (rid,)).fetchone()
+        return self.row_to_doc(row) if row else None
+
+    def update(self, rid, **fields):
+        db = self.conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT id, doc FROM requests WHERE id = ?", (rid,)).fetchone()
+            if not row:
+                db.execute("ROLLBACK")
+                return None
+            doc = self.row_to_doc(row)
+            previous = doc['status']
+            doc.update(fields)
+            body = {k: v for k, v in doc.items() if k != 'id'}
+            db.execute(
+                "UPDATE requests SET status = ?, updated_at = ?, doc = ? WHERE id = ?",
+                (doc['status'], doc.get('updated_at') or doc['created_at'], json.dumps(body), rid)
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return previous, doc
+
+    def list(self, status=None):
+        if status:
+            rows = self.conn().execute("SELECT id, doc FROM requests WHERE status = ? ORDER BY id", (status,))
+        else:
+            rows = self.conn().execute("SELECT id, doc FROM requests ORDER BY id")
+        return [self.row_to_doc(r) for r in rows]
+
+    def page(self, limit=50, before=None, since=None, status=None, req_type=None, space_key=None,
+             created_from=None, created_to=None, since_id=None):
+        where, args = [], []
+        for clause, value in (("status = ?", status), ("type = ?", req_type), ("space_key = ?", space_key),
+                              ("created_at >= ?", created_from), ("created_at < ?", created_to),
+                              ("id < ?", before)):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        if since is not None and since_id is not None:
+            where.append("(updated_at > ? OR (updated_at = ? AND id > ?))")
+            args.extend((since, since, since_id))
+        elif since is not None:
+            where.append("updated_at > ?")
+            args.append(since)
+        order = "updated_at, id" if since is not None else "id DESC"
+        sql = "SELECT id, doc FROM requests"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.conn().execute(f"{sql} ORDER BY {order} LIMIT ?", (*args, limit))
+        return [self.row_to_doc(r) for r in rows]
+
+    def counts(self):
+        rows = self.conn().execute("SELECT type, status, COUNT(*) AS n FROM requests GROUP BY type, status")
+        return [(r['type'], r['status'], r['n']) for r in rows]
+
+    def migrate_json(self, json_file):
+        db = self.conn()
+        if not os.path.exists(json_file):
+            return 0
+        if db.execute("SELECT 1 FROM requests LIMIT 1").fetchone():
+            return 0
+        with open(json_file, 'r') as f:
+            docs = json.load(f)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for doc in docs:
+                self.insert(db, doc, doc.get('id'))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        os.replace(json_file, f"{json_file}.migrated")
+        logger.info(f"Migrated {len(docs)} requests from {json_file} to {self.path}")
+        return len(docs)
+
+
+class JSONRequestStore(RequestStore):
+    # the original whole-file store, kept for REQUEST_STORE=json
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return []
+
+    def save(self, data):
+        with open(self.path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def create(self, doc):
+        with self.lock:
+            db = self.load()
+            req = {'id': max([r.get('id', 0) for r in db], default=0) + 1, **doc}
+            db.append(req)
+            self.save(db)
+        return req
+
+    def get(self, rid):
+        return next((r for r in self.load() if r['id'] == rid), None)
+
+    def update(self, rid, **fields):
+        with self.lock:
+            db = self.load()
+            req = next((r for r in db if r['id'] == rid), None)
+            if not req:
+                return None
+            previous = req['status']
+            req.update(fields)
+            self.save(db)
+        return previous, req
+
+    def list(self, status=None):
+        return [r for r in self.load() if not status or r['status'] == status]
+
+    def page(self, limit=50, before=None, since=None, status=None, req_type=None, space_key=None,
+             created_from=None, created_to=None, since_id=None):
+        def keep(r):
+            return ((status is None or r['status'] == status)
+                    and (req_type is None or request_type(r) == req_type)
+                    and (space_key is None or (r.get('data') or {}).get('space_key') == space_key)
+                    and (created_from is None or r['created_at'] >= created_from)
+                    and (created_to is None or r['created_at'] < created_to)
+                    and (before is None or r['id'] < before)
+                    and (since is None or changed(r) > (since, since_id if since_id is not None else float('inf'))))
+
+        def changed(r):
+            return r.get('updated_at') or r['created_at'], r['id']
+        found = [r for r in self.load() if keep(r)]
+        if since is not None:
+            found.sort(key=changed)
+        else:
+            found.sort(key=lambda r: r['id'], reverse=True)
+        return found[:limit]
+
+    def counts(self):
+        found = {}
+        for r in self.load():
+            key = (request_type(r), r['status'])
+            found[key] = found.get(key, 0) + 1
+        return [(t, s, n) for (t, s), n in found.items()]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class RequestStats:
+    # counters kept in step with every status change, so /api/stats never reads the store
+    def __init__(self, window=60, samples=1000):
+        self.window = window
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.created_at = deque()
+        self.completed_at = deque()
+        self.latencies = {}
+
+    def seed(self, store):
+        with self.lock:
+            for req_type, status, n in store.counts():
+                self.counts.setdefault(req_type, {})[status] = n
+
+    def bump(self, req_type, status, n):
+        by_status = self.counts.setdefault(req_type, {})
+        by_status[status] = by_status.get(status, 0) + n
+
+    def prune(self, times, now):
+        while times and now - times[0] > self.window:
+            times.popleft()
+
+    def created(self, req):
+        now = time.monotonic()
+        with self.lock:
+            self.bump(request_type(req), req['status'], 1)
+            self.created_at.append(now)
+            self.prune(self.created_at, now)
+
+    def transition(self, req, previous):
+        if previous == req['status']:
+            return
+        now = time.monotonic()
+        req_type = request_type(req)
+        with self.lock:
+            self.bump(req_type, previous, -1)
+            self.bump(req_type, req['status'], 1)
+            if req['status'] != 'completed':
+                return
+            self.completed_at.append(now)
+            self.prune(self.completed_at, now)
+            try:
+                took = (datetime.fromisoformat(req['updated_at']) - datetime.fromisoformat(req['created_at'])).total_seconds()
+            except (KeyError, TypeError, ValueError):
+                return
+            self.latencies.setdefault(req_type, deque(maxlen=self.samples)).append(took)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            self.prune(self.created_at, now)
+            self.prune(self.completed_at, now)
+            out = {"total": 0, "pending": 0, "processing": 0, "completed": 0, "failed": 0}
+            by_type = {}
+            for req_type, by_status in self.counts.items():
+                by_type[req_type] = {**by_status, "total": sum(by_status.values())}
+                for status, n in by_status.items():
+                    out[status] = out.get(status, 0) + n
+                    out["total"] += n
+            latency = {}
+            for req_type, values in self.latencies.items():
+                ordered = sorted(values)
+                latency[req_type] = {"p50": percentile(ordered, 0.5), "p95": percentile(ordered, 0.95),
+                                     "samples": len(ordered)}
+            scale = 60 / self.window
+            out.update({
+                "by_type": by_type,
+                "per_minute": {"created": len(self.created_at) * scale, "completed": len(self.completed_at) * scale},
+                "latency_seconds": latency
+            })
+            return out
+
+
+def open_store(json_file):
+    if os.getenv('REQUEST_STORE', 'sqlite') == 'json':
+        return JSONRequestStore(json_file)
+    store = SQLiteRequestStore(os.getenv('REQUEST_DB', os.path.splitext(json_file)[0] + '.db'))
+    store.migrate_json(json_file)
+    return store
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ScanCache:
+    # rules: returns the version of whatever decides a verdict (patterns, allowlist),
+    # entries stored under another version are treated as missing
+    def __init__(self, capacity=10000, path=None, save_every=500, rules=None):
+        self.capacity = capacity
+        self.path = path
+        self.save_every = save_every
+        self.rules = rules or (lambda: None)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = 0
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def lookup(self, page_id, digest):
+        rules = self.rules()
+        with self.lock:
+            entry = self.entries.get(page_id)
+            if entry and entry['digest'] == digest and entry.get('rules') == rules:
+                self.entries.move_to_end(page_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def get(self, page_id):
+        rules = self.rules()
+        with self.lock:
+            entry = self.entries.get(page_id)
+        return entry if entry and entry.get('rules') == rules else None
+
+    def store(self, page_id, digest, verdict, version=None, **extra):
+        rules = self.rules()
+        with self.lock:
+            self.entries[page_id] = {'digest': digest, 'verdict': verdict, 'version': version, 'rules': rules, **extra}
+            self.entries.move_to_end(page_id)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.dirty += 1
+            flush = self.path and self.dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            for page_id, entry in data[-self.capacity:]:
+                self.entries[page_id] = entry
+            logger.info(f"Loaded {len(self.entries)} scan cache entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Could not load scan cache {self.path}: {e}")
+
+    def save(self):
+        if not self.path: return
+        with self.lock:
+            data = list(self.entries.items())
+            self.dirty = 0
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"Could not save scan cache {self.path}: {e}")
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'persisted': bool(self.path)
+            }
@@ -0,0 +1,296 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from allowlist import Allowlist
+
+MASK_MESSAGE = "Auto-masked secrets"
+
+# Whitespace around the separator is capped at 64 characters, so a match can
+# only start a bounded distance (LEAD) before the secret it captures. A
+# Password value starting with '***' is our own masking, not a secret.
+PATTERNS = {
+    'AWS Key': r'AKIA[0-9A-Z]{16}',
+    'AWS Secret': r'(?:aws_secret_access_key|AWS_SECRET_ACCESS_KEY)\s{0,64}[:=]\s{0,64}([A-Za-z0-9/+=]{40})',
+    'GitHub Token': r'ghp_[a-zA-Z0-9]{36}',
+    'API Key': r'(?:api[_\s-]?key|apikey)\s{0,64}[:=]\s{0,64}["\']?([a-zA-Z0-9_\-]{8,})["\']?',
+    'Password': r'(?:password|passwd|pwd|pass)\s{0,64}[:=]\s{0,64}["\']?((?!\*{3})[a-zA-Z0-9!@#$%^&*_\-]{3,})["\']?',
+    'SSH Key': r'-----BEGIN (?:RSA|OPENSSH|DSA|EC) PRIVATE KEY-----'
+}
+
+# Longest keyword, both gaps, the separator, a quote and the longest minimum
+# value (AWS Secret's 40). A finding that depends on a character can start at
+# most this far before it, which is what makes an incremental rescan with at
+# least this much margin give the same result as a full one.
+LEAD = len('aws_secret_access_key') + 64 + 1 + 64 + 1 + 40
+
+# Literal every match of the pattern starts with. The engine only runs a
+# pattern where one of these occurs, so a page is walked once no matter how
+# many patterns there are.
+PREFIXES = {
+    'AWS Key': ['akia'],
+    'AWS Secret': ['aws_secret_access_key'],
+    'GitHub Token': ['ghp_'],
+    'API Key': ['api'],
+    'Password': ['pass', 'pwd'],
+    'SSH Key': ['-----begin']
+}
+
+# Non-ASCII characters that re.IGNORECASE treats as equal to an ASCII letter
+# but that str.lower() leaves alone.
+EXTRA_FOLDS = {'\u017f': 's', '\u0131': 'i'}
+
+
+def fold(content):
+    low = content.lower()
+    if content.isascii():
+        return low
+    if len(low) != len(content):
+        return None
+    for ch, ascii in EXTRA_FOLDS.items():
+        if ch in low:
+            low = low.replace(ch, ascii)
+    return low
+
+
+class ScanEngine:
+    def __init__(self, patterns=PATTERNS, prefixes=PREFIXES, entropy=None, lead=LEAD):
+        self.names = list(patterns)
+        self.compiled = {n: re.compile(p, re.IGNORECASE) for n, p in patterns.items()}
+
+        # first character of a prefix -> patterns that may start there
+        self.buckets = {}
+        literals = set()
+        for name in self.names:
+            for lit in prefixes[name]:
+                literals.add(lit)
+                bucket = self.buckets.setdefault(lit[0], [])
+                if name not in bucket:
+                    bucket.append(name)
+
+        alternation = '|'.join(re.escape(l) for l in sorted(literals, key=len, reverse=True))
+        self.reach = max(len(l) for l in literals) - 1
+        self.trigger = re.compile(alternation)
+        self.trigger_ci = re.compile(alternation, re.IGNORECASE)
+
+        # optional second stage for tokens without a known prefix (entropy.py)
+        self.entropy = entropy
+        self.lead = lead
+        if entropy:
+            self.names += entropy.types
+            # a token is a finding on its own, but up to max_length (+ padding) long
+            self.lead = max(lead, entropy.max_length + 3)
+        self.order = {n: i for i, n in enumerate(self.names)}
+
+        # changes with anything that changes what a scan finds, so verdicts
+        # cached under other patterns or settings aren't trusted
+        rules = [patterns, prefixes, entropy.settings() if entropy else None]
+        self.version = hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16]
+
+    def scan(self, content, pos=0, endpos=None, resume=None):
+        # resume: where the previous match of each pattern ended, when
+        # carrying on a scan from an earlier piece of the same text
+        if endpos is None:
+            endpos = len(content)
+        start = pos
+        low = fold(content)
+        if low is None:
+            # lower() changed the length, offsets would drift
+            low, search = content, self.trigger_ci.search
+        else:
+            search = self.trigger.search
+
+        last_end = dict.fromkeys(self.names, pos)
+        if resume:
+            last_end.update(resume)
+        # a prefix starting just before endpos still has to be seen whole
+        window_end = min(len(content), endpos + self.reach)
+        detected = []
+        while True:
+            hit = search(low, pos, window_end)
+            if not hit or hit.start() >= endpos:
+                break
+            at = hit.start()
+            pos = at + 1
+            first = low[at].lower()
+            for name in self.buckets.get(EXTRA_FOLDS.get(first, first), ()):
+                # re.finditer never reports a match inside the previous one
+                if at < last_end[name]:
+                    continue
+                m = self.compiled[name].match(content, at)
+                if not m:
+                    continue
+                last_end[name] = m.end()
+                if m.lastindex:
+                    detected.append({'type': name, 'text': m.group(1), 'start': m.start(1), 'end': m.end(1)})
+                else:
+                    detected.append({'type': name, 'text': m.group(0), 'start': m.start(), 'end': m.end()})
+        if self.entropy:
+            detected += self.entropy_stage(content, start, endpos, detected, last_end)
+        detected.sort(key=lambda d: (self.order[d['type']], d['start']))
+        return detected
+
+    def entropy_stage(self, content, pos, endpos, detected, last_end):
+        # a token a pattern already matched is reported once, under the pattern's name
+        spans = merge_spans(detected)
+        ends = [end for _, end in spans]
+        found = []
+        for sec in self.entropy.scan(content, pos, endpos):
+            if sec['start'] < last_end[sec['type']]:
+                continue
+            i = bisect.bisect_right(ends, sec['start'])
+            if i < len(spans) and spans[i][0] < sec['end']:
+                continue
+            found.append(sec)
+        return found
+
+    def scan_changed(self, old, old_secrets, new, margin=1024):
+        # any less and a match could start outside the window yet depend on the edit
+        margin = max(margin, self.lead)
+        p = common_prefix(old, new)
+        s = common_suffix(old, new, min(len(old), len(new)) - p)
+        shift = len(new) - len(old)
+        start = max(0, p - margin)
+        stop = len(old) - s + margin
+
+        # A finding cut by the window edge has to be found again in full.
+        # Its match starts up to `margin` before the captured secret.
+        moved = True
+        while moved:
+            moved = False
+            for sec in old_secrets:
+                if max(0, sec['start'] - margin) < start < sec['end']:
+                    start = max(0, sec['start'] - margin)
+                    moved = True
+                if sec['start'] - margin < stop < sec['end']:
+                    stop = sec['end'] + margin
+                    moved = True
+        stop = min(len(new), stop + shift)
+
+        found = self.scan(new, start, stop)
+        reach = dict.fromkeys(self.names, stop)
+        for sec in found:
+            reach[sec['type']] = max(reach[sec['type']], sec['end'])
+
+        detected = [sec for sec in old_secrets if sec['end'] <= start]
+        for sec in old_secrets:
+            if sec['start'] + shift >= reach[sec['type']]:
+                detected.append({**sec, 'start': sec['start'] + shift, 'end': sec['end'] + shift})
+        detected += found
+        detected.sort(key=lambda d: (self.order[d['type']], d['start']))
+        return detected
+
+
+def common_prefix(a, b, step=4096):
+    n = min(len(a), len(b))
+    i = 0
+    while i + step <= n and a[i:i + step] == b[i:i + step]:
+        i += step
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix(a, b, limit, step=4096):
+    la, lb = len(a), len(b)
+    i = 0
+    while i + step <= limit and a[la - i - step:la - i] == b[lb - i - step:lb - i]:
+        i += step
+    while i < limit and a[la - i - 1] == b[lb - i - 1]:
+        i += 1
+    return i
+
+
+# Keeps the last clean body of large pages so an edit only rescans the part
+# that changed, plus `margin` characters either side for matches that cross
+# the edge of the edit.
+class IncrementalScanner:
+    def __init__(self, engine, min_size=256 * 1024, margin=1024, max_bytes=256 * 1024 * 1024):
+        self.engine = engine
+        self.min_size = min_size
+        self.margin = margin
+        self.max_bytes = max_bytes
+        self.previous = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counts = {'full': 0, 'incremental': 0}
+
+    def scan(self, page_id, content, fetch_previous=None):
+        if len(content) < self.min_size:
+            self.counts['full'] += 1
+            return self.engine.scan(content)
+        with self.lock:
+            prev = self.previous.get(page_id)
+        if prev is None and fetch_previous:
+            prev = fetch_previous()
+        if prev is None:
+            self.counts['full'] += 1
+            return self.engine.scan(content)
+        old, old_secrets = prev
+        self.counts['incremental'] += 1
+        return self.engine.scan_changed(old, old_secrets, content, self.margin)
+
+    def remember(self, page_id, content, secrets):
+        if len(content) < self.min_size:
+            return self.forget(page_id)
+        with self.lock:
+            self._drop(page_id)
+            self.previous[page_id] = (content, secrets)
+            self.size += len(content)
+            while self.size > self.max_bytes and self.previous:
+                self._drop(next(iter(self.previous)))
+
+    def forget(self, page_id):
+        with self.lock:
+            self._drop(page_id)
+
+    def _drop(self, page_id):
+        prev = self.previous.pop(page_id, None)
+        if prev:
+            self.size -= len(prev[0])
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'pages': len(self.previous), 'bytes': self.size}
+
+
+def default_entropy():
+    if os.getenv('ENTROPY_SCAN', '0') != '1':
+        return None
+    from entropy import EntropyDetector
+    return EntropyDetector()
+
+
+engine = ScanEngine(entropy=default_entropy())
+allowlist = Allowlist(os.getenv('ALLOWLIST_FILE') or None)
+
+
+def scan_content(content, space=None, page=None):
+    # space/page pick up allowlist entries scoped to them as well as global ones
+    return allowlist.filter(engine.scan(content), space, page)
+
+
+def merge_spans(secrets):
+    # overlapping findings (say API Key and Password on one line) become one span
+    merged = []
+    for start, end in sorted((s['start'], s['end']) for s in secrets):
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def mask_content(content, secrets):
+    if not secrets: return content
+    parts = []
+    pos = 0
+    for start, end in merge_spans(secrets):
+        parts.append(content[pos:start])
+        parts.append('*' * min(end - start, 20))
+        pos = end
+    parts.append(content[pos:])
+    return ''.join(parts)
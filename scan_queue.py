@@ -0,0 +1,198 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ScanQueue:
+    def __init__(self, handler, workers=4, maxsize=1000):
+        self.handler = handler
+        self.q = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.accepting = True
+        self.counts = {'enqueued': 0, 'deduplicated': 0, 'rejected': 0, 'processed': 0, 'failed': 0}
+        self.queued = set()
+        self.in_flight = 0
+        self.high_water = 0
+        self.wait_total = 0.0
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"scan-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, page_id):
+        if not self.accepting:
+            self._count('rejected')
+            return False
+        with self.lock:
+            # already waiting for a worker, which will fetch the latest version
+            if page_id in self.queued:
+                self.counts['deduplicated'] += 1
+                return True
+            try:
+                self.q.put_nowait((page_id, time.monotonic()))
+            except queue.Full:
+                self.counts['rejected'] += 1
+                logger.warning(f"Scan queue full, rejected page {page_id}")
+                return False
+            self.queued.add(page_id)
+            self.counts['enqueued'] += 1
+            self.high_water = max(self.high_water, self.q.qsize())
+        return True
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _work(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                self.q.task_done()
+                return
+            page_id, queued_at = item
+            with self.lock:
+                self.queued.discard(page_id)
+                self.in_flight += 1
+                self.wait_total += time.monotonic() - queued_at
+            try:
+                res = self.handler(page_id)
+                logger.info(f"Page {page_id}: {res}")
+                self._count('processed')
+            except Exception as e:
+                logger.error(f"Scan of page {page_id} failed: {e}")
+                self._count('failed')
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                self.q.task_done()
+
+    def drain(self, timeout=30):
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        logger.info(f"Draining scan queue ({self.q.qsize()} queued, {self.in_flight} running)")
+        while self.q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+        left = self.q.qsize()
+        if left:
+            logger.warning(f"Drain timed out, {left} pages left unscanned")
+        for _ in self.threads:
+            try:
+                self.q.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self.threads:
+            t.join(max(0, deadline - time.monotonic()))
+        return left
+
+    def stats(self):
+        with self.lock:
+            done = self.counts['processed'] + self.counts['failed']
+            return {
+                **self.counts,
+                'depth': self.q.qsize(),
+                'capacity': self.q.maxsize,
+                'in_flight': self.in_flight,
+                'workers': len(self.threads),
+                'high_water': self.high_water,
+                'avg_wait_ms': round(self.wait_total / (done + self.in_flight) * 1000, 1) if done + self.in_flight else 0.0,
+                'accepting': self.accepting
+            }
+
+
+class EventCoalescer:
+    def __init__(self, scan_queue, delay=2.0, remember=10000):
+        self.scan_queue = scan_queue
+        self.delay = delay
+        self.remember = remember
+        self.pending = {}
+        self.heap = []
+        self.own_versions = OrderedDict()
+        self.scanned_versions = OrderedDict()
+        self.cond = threading.Condition()
+        self.counts = {'received': 0, 'dispatched': 0, 'coalesced': 0, 'own_edit': 0, 'stale': 0, 'rejected': 0}
+        threading.Thread(target=self._run, name="scan-coalescer", daemon=True).start()
+
+    def submit(self, page_id, version=None):
+        with self.cond:
+            self.counts['received'] += 1
+            if version is not None:
+                if self.own_versions.get(page_id) == version:
+                    self.counts['own_edit'] += 1
+                    return True
+                if self.scanned_versions.get(page_id, 0) >= version:
+                    self.counts['stale'] += 1
+                    return True
+            due = time.monotonic() + self.delay
+            entry = self.pending.get(page_id)
+            if entry:
+                self.counts['coalesced'] += 1
+                entry[0] = due
+                if version is not None:
+                    entry[1] = max(entry[1] or 0, version)
+            else:
+                if not self.scan_queue.accepting or self.scan_queue.q.full():
+                    self.counts['rejected'] += 1
+                    return False
+                self.pending[page_id] = [due, version]
+            heapq.heappush(self.heap, (due, page_id))
+            self.cond.notify()
+        return True
+
+    def mark_scanned(self, page_id, version):
+        with self.cond:
+            self._remember(self.scanned_versions, page_id, version)
+
+    def mark_own(self, page_id, version):
+        with self.cond:
+            self._remember(self.own_versions, page_id, version)
+            self._remember(self.scanned_versions, page_id, version)
+
+    def _remember(self, versions, page_id, version):
+        versions[page_id] = version
+        versions.move_to_end(page_id)
+        if len(versions) > self.remember:
+            versions.popitem(last=False)
+
+    def _run(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    due, page_id = heapq.heappop(self.heap)
+                    entry = self.pending.get(page_id)
+                    # superseded by a later event for the same page
+                    if not entry or entry[0] != due:
+                        continue
+                    self._dispatch(page_id, now)
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.cond.wait(timeout)
+
+    def _dispatch(self, page_id, now):
+        if self.scan_queue.submit(page_id):
+            del self.pending[page_id]
+            self.counts['dispatched'] += 1
+        else:
+            # queue is full, try again once it had time to drain
+            self.pending[page_id][0] = now + self.delay
+            heapq.heappush(self.heap, (now + self.delay, page_id))
+
+    def flush(self):
+        with self.cond:
+            now = time.monotonic()
+            for page_id in list(self.pending):
+                self._dispatch(page_id, now)
+
+    def stats(self):
+        with self.cond:
+            c = self.counts
+            return {
+                **c,
+                'pending': len(self.pending),
+                'fetches_avoided': c['coalesced'] + c['own_edit'] + c['stale'] + self.scan_queue.counts['deduplicated']
+            }
@@ -1,87 +1,232 @@
 from flask import Flask, request, jsonify
-from atlassian import Confluence
-import re
 import logging
-import requests
-from vault_utils import VaultManager
+import os
+import signal
+import sys
+from vault_utils import confluence_auth
+from confluence_client import get_client
+from scan_engine import MASK_MESSAGE, engine, allowlist, mask_content, IncrementalScanner
+from scan_queue import ScanQueue, EventCoalescer
+from scan_cache import ScanCache
+from attachment_scanner import AttachmentScanner
+from findings_ledger import DEFAULT_PATH, FindingsLedger
+from metrics import REGISTRY, SIZE_BUCKETS, counter, histogram, timed, flask_metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-URL = "http://57.159.25.203:8090"
-
-try:
-    vault = VaultManager()
-    USER, PW = vault.get_confluence_credentials()
-    confluence = Confluence(url=URL, username=USER, password=PW)
-except Exception as e:
-    logger.critical(f"Vault error: {e}")
-    raise RuntimeError("Vault required")
-
-PATTERNS = {
-    'AWS Key': r'AKIA[0-9A-Z]{16}',
-    'AWS Secret': r'(?:aws_secret_access_key|AWS_SECRET_ACCESS_KEY)\s*[:=]\s*([A-Za-z0-9/+=]{40})',
-    'GitHub Token': r'ghp_[a-zA-Z0-9]{36}',
-    'API Key': r'(?:api[_\s-]?key|apikey)\s*[:=]\s*["\']?([a-zA-Z0-9_\-]{8,})["\']?',
-    'Password': r'(?:password|passwd|pwd|pass)\s*[:=]\s*["\']?([a-zA-Z0-9!@#$%^&*_\-]{3,})["\']?',
-    'SSH Key': r'-----BEGIN (?:RSA|OPENSSH|DSA|EC) PRIVATE KEY-----'
-}
-
-def scan_content(content):
-    detected = []
-    for name, pattern in PATTERNS.items():
-        for match in re.finditer(pattern, content, re.IGNORECASE):
-            if match.lastindex:
-                detected.append({'type': name, 'text': match.group(1), 'start': match.start(1), 'end': match.end(1)})
-            else:
-                detected.append({'type': name, 'text': match.group(0), 'start': match.start(), 'end': match.end()})
-    return detected
-
-def mask_content(content, secrets):
-    if not secrets: return content
-    sorted_secrets = sorted(secrets, key=lambda x: x['start'], reverse=True)
-    for s in sorted_secrets:
-        mask = '*' * min(len(s['text']), 20)
-        content = content[:s['start']] + mask + content[s['end']:]
-    return content
+URL = os.getenv('CONFLUENCE_URL', "http://57.159.25.203:8090")
+
+# credentials are read from Vault on the first request and refreshed in the background
+client = get_client(URL, auth=confluence_auth(), consumer='scanner')
+confluence = client.confluence
+
+SCAN_SECONDS = histogram('scan_seconds', 'Time to scan a page body for secrets')
+MASK_SECONDS = histogram('mask_seconds', 'Time to mask the secrets found in a page body')
+PAGE_BYTES = histogram('page_size_bytes', 'Size of the page bodies scanned', buckets=SIZE_BUCKETS)
+SECRETS_FOUND = counter('secrets_found_total', 'Secrets found, by pattern and where', ('type', 'source'))
+PAGES = counter('pages_processed_total', 'Pages processed, by outcome', ('status',))
+
+def previous_body(page_id):
+    # the last clean version, checked against its hash so the diff is sound
+    entry = scan_cache.get(page_id)
+    # only a version without any findings, allowlisted ones included, since
+    # its findings aren't kept and the diff needs them
+    if (not INCREMENTAL_FETCH or not entry or entry['verdict'] != 'clean' or not entry.get('version')
+            or entry.get('found') != 0):
+        return None
+    old = confluence.get_page_by_id(page_id, expand='body.storage', status='historical', version=entry['version'])
+    body = old['body']['storage']['value']
+    if scan_cache.digest(body) != entry['digest']:
+        return None
+    return body, []
+
+@timed
+def scan_attachments(page_id, space=None):
+    if not ATTACHMENT_SCAN: return []
+
+    def seen(att):
+        return scan_cache.lookup(f"attachment:{att['id']}", str(att.get('version', {}).get('number')))
+
+    found = []
+    for res in attachment_scanner.scan_page(page_id, skip=seen):
+        res['findings'] = allowlist.filter(res['findings'], space, page_id)
+        # attachments are versioned, so the version number stands in for the hash
+        scan_cache.store(f"attachment:{res['id']}", str(res['version']), 'found' if res['findings'] else 'clean', res['version'])
+        if res['findings']:
+            logger.warning(f"{len(res['findings'])} secrets in attachment {res['title']} on page {page_id}")
+            for f in res['findings']:
+                SECRETS_FOUND.inc(type=f['type'], source='attachment')
+            if ledger:
+                ledger.record(page_id, space, res['version'], res['findings'], attachment_id=res['id'])
+            found.append({
+                'id': res['id'], 'title': res['title'], 'count': len(res['findings']),
+                'types': sorted({f['type'] for f in res['findings']}), 'truncated': res['truncated']
+            })
+    return found
+
+@timed
+def process_page(page_id):
+    res = _process_page(page_id)
+    PAGES.inc(status=res['status'])
+    return res
+
+def _process_page(page_id):
+    page = confluence.get_page_by_id(page_id, expand='body.storage,version,space')
+    content = page['body']['storage']['value']
+    ver = page['version']['number']
+    title = page['title']
+    space = (page.get('space') or {}).get('key')
+    # uploads don't bump the page version, so check them even after our own edit
+    attachments = scan_attachments(page_id, space)
+
+    if page['version'].get('message') == MASK_MESSAGE:
+        coalescer.mark_scanned(page_id, ver)
+        return {'status': 'skipped', 'reason': 'own edit', 'attachments': attachments}
+
+    digest = scan_cache.digest(content)
+    if scan_cache.lookup(page_id, digest):
+        coalescer.mark_scanned(page_id, ver)
+        return {'status': 'skipped', 'reason': 'body unchanged', 'attachments': attachments}
+
+    PAGE_BYTES.observe(len(content))
+    with SCAN_SECONDS.time():
+        found = incremental.scan(page_id, content, lambda: previous_body(page_id))
+    coalescer.mark_scanned(page_id, ver)
+    secrets = allowlist.filter(found, space, page_id)
+    if not secrets:
+        # the next diff needs the allowlisted findings too, in case the list changes
+        incremental.remember(page_id, content, found)
+        scan_cache.store(page_id, digest, 'clean', ver, found=len(found))
+        return {'status': 'clean', 'attachments': attachments}
+    incremental.forget(page_id)
+
+    for secret in secrets:
+        SECRETS_FOUND.inc(type=secret['type'], source='page')
+    if ledger:
+        ledger.record(page_id, space, ver, secrets)
+    with MASK_SECONDS.time():
+        masked = mask_content(content, secrets)
+
+    resp = client.put(f"/rest/api/content/{page_id}", json={
+        "version": {"number": ver + 1, "message": MASK_MESSAGE},
+        "title": title, "type": "page",
+        "body": {"storage": {"value": masked, "representation": "storage"}}
+    })
+    resp.raise_for_status()
+    coalescer.mark_own(page_id, ver + 1)
+    scan_cache.store(page_id, scan_cache.digest(masked), 'masked', ver + 1)
+    return {'status': 'masked', 'count': len(secrets), 'attachments': attachments}
+
+# every finding, by fingerprint, for /findings; FINDINGS_DB= turns it off
+FINDINGS_DB = os.getenv('FINDINGS_DB', DEFAULT_PATH)
+ledger = FindingsLedger(FINDINGS_DB) if FINDINGS_DB else None
+
+# a pattern or allowlist change makes every cached verdict stale
+scan_cache = ScanCache(
+    capacity=int(os.getenv('SCAN_CACHE_SIZE', '10000')),
+    path=os.getenv('SCAN_CACHE_FILE') or None,
+    rules=lambda: f"{engine.version}:{allowlist.version}"
+)
+
+incremental = IncrementalScanner(
+    engine,
+    min_size=int(os.getenv('INCREMENTAL_MIN_SIZE', str(256 * 1024))),
+    margin=int(os.getenv('INCREMENTAL_MARGIN', '1024')),
+    max_bytes=int(os.getenv('INCREMENTAL_CACHE_MB', '256')) * 1024 * 1024
+)
+INCREMENTAL_FETCH = os.getenv('INCREMENTAL_FETCH_PREVIOUS', '0') == '1'
+
+ATTACHMENT_SCAN = os.getenv('ATTACHMENT_SCAN', '1') == '1'
+attachment_scanner = AttachmentScanner(
+    client.session, URL,
+    max_bytes=int(os.getenv('ATTACHMENT_MAX_MB', '20')) * 1024 * 1024
+)
+
+scan_queue = ScanQueue(
+    process_page,
+    workers=int(os.getenv('SCAN_WORKERS', '4')),
+    maxsize=int(os.getenv('SCAN_QUEUE_SIZE', '1000'))
+)
+coalescer = EventCoalescer(scan_queue, delay=float(os.getenv('SCAN_DEBOUNCE_SECONDS', '2')))
+
+# the existing stats() dicts, exported as gauges on /metrics
+REGISTRY.stats('scan_queue', scan_queue.stats, 'Scan queue depth, workers and counts')
+REGISTRY.stats('scan_events', coalescer.stats, 'Webhook events received, coalesced and skipped')
+REGISTRY.stats('scan_cache', scan_cache.stats, 'Scan cache size, hits, misses and hit rate')
+REGISTRY.stats('scan_incremental', incremental.stats, 'Incremental scanner counts and memory')
+REGISTRY.stats('allowlist', allowlist.stats, 'Allowlist size, reloads and suppressed findings')
+if ledger:
+    REGISTRY.stats('findings_ledger', ledger.stats, 'Findings written, queued and dropped')
+REGISTRY.stats('vault_credentials', confluence_auth().provider.stats, 'Vault credential loads and expiry')
+flask_metrics(app, 'scanner')
+
+def event_version(data):
+    page = data.get('page') or data.get('content') or data
+    ver = page.get('version')
+    if isinstance(ver, dict): ver = ver.get('number')
+    try:
+        return int(ver)
+    except (TypeError, ValueError):
+        return None
 
 @app.route('/webhook/page-updated', methods=['POST'])
 @app.route('/webhook/page-created', methods=['POST'])
+@app.route('/webhook/attachment-created', methods=['POST'])
+@app.route('/webhook/attachment-updated', methods=['POST'])
 def handle_webhook():
     data = request.json
-    page_id = data.get('page', {}).get('id') or data.get('content', {}).get('id') or data.get('id')
+    page_id = (data.get('page', {}).get('id') or data.get('content', {}).get('id')
+               or data.get('attachedTo', {}).get('id') or data.get('id'))
     if not page_id: return jsonify({'error': 'no id'}), 400
-    
-    try:
-        page = confluence.get_page_by_id(page_id, expand='body.storage,version')
-        content = page['body']['storage']['value']
-        ver = page['version']['number']
-        title = page['title']
-        
-        secrets = scan_content(content)
-        if not secrets: return jsonify({'status': 'clean'}), 200
-        
-        masked = mask_content(content, secrets)
-        
-        resp = requests.put(
-            f"{URL}/rest/api/content/{page_id}",
-            json={
-                "version": {"number": ver + 1, "message": "Auto-masked secrets"},
-                "title": title, "type": "page",
-                "body": {"storage": {"value": masked, "representation": "storage"}}
-            },
-            auth=(USER, PW),
-            headers={"Content-Type": "application/json"}
-        )
-        return jsonify({'status': 'masked', 'count': len(secrets)}), 200
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
+    page_id = str(page_id)
+
+    # an attachment event carries the page (or attachment) version the page is
+    # already at, so it must not be taken for a stale page event
+    version = None if request.path.startswith('/webhook/attachment') else event_version(data)
+    if not coalescer.submit(page_id, version):
+        return jsonify({'error': 'busy'}), 503, {'Retry-After': '30'}
+    return jsonify({'status': 'queued', 'page_id': page_id}), 202
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'ok'})
+    q = scan_queue.stats()
+    return jsonify({'status': 'ok' if q['accepting'] else 'draining', 'queue': q, 'events': coalescer.stats(), 'cache': scan_cache.stats(), 'incremental': incremental.stats(), 'vault': confluence_auth().provider.stats(), 'allowlist': allowlist.stats(), 'findings': ledger.stats() if ledger else None})
+
+@app.route('/findings')
+def findings():
+    # aggregates from the daily rollup, plus the latest rows for the same filter
+    if not ledger:
+        return jsonify({'error': 'findings ledger is off'}), 404
+    args = request.args
+    try:
+        days = max(1, min(int(args.get('days', 30)), 3650))
+        top = max(1, min(int(args.get('top', 10)), 1000))
+        limit = max(1, min(int(args.get('limit', 20)), 1000))
+    except ValueError:
+        return jsonify({'error': 'days, top and limit must be numbers'}), 400
+    space_key, secret_type = args.get('space_key') or None, args.get('type') or None
+    res = ledger.summary(days, space_key, secret_type, top)
+    res['recent'] = ledger.recent(limit, space_key, secret_type, args.get('page_id') or None)
+    return jsonify(res)
+
+@app.route('/allowlist/reload', methods=['POST'])
+def reload_allowlist():
+    ok = allowlist.reload()
+    return jsonify({'status': 'reloaded' if ok else 'failed', 'allowlist': allowlist.stats()}), 200 if ok else 500
+
+def shutdown(signum, frame):
+    coalescer.flush()
+    scan_queue.drain(int(os.getenv('SCAN_DRAIN_TIMEOUT', '30')))
+    scan_cache.save()
+    if ledger:
+        ledger.flush()
+    sys.exit(0)
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    # `systemctl reload` / kill -HUP picks up allowlist changes
+    signal.signal(signal.SIGHUP, lambda signum, frame: allowlist.reload())
     app.run(host='0.0.0.0', port=5002)
@@ -1,15 +1,17 @@
-import requests
 import json
+import os
 import sys
-from vault_utils import VaultManager
+from vault_utils import confluence_auth
+from confluence_client import get_client
 
 # Config
-CONF_URL = "http://57.159.25.203:8090"
-SCANNER_URL = "http://127.0.0.1:5002"
+CONF_URL = os.getenv('CONFLUENCE_URL', "http://57.159.25.203:8090")
+SCANNER_URL = os.getenv('SCANNER_URL', "http://127.0.0.1:5002")
 
 try:
-    vault = VaultManager()
-    USER, PW = vault.get_confluence_credentials()
+    auth = confluence_auth()
+    auth.provider.get()
+    client = get_client(CONF_URL, auth=auth, consumer='setup')
 except Exception as e:
     print(f"Vault failed: {e}")
     sys.exit(1)
@@ -21,19 +23,14 @@ def create_hook(event, endpoint):
         "events": [event],
         "active": True
     }
-    r = requests.post(
-        f"{CONF_URL}/rest/api/webhooks",
-        auth=(USER, PW),
-        headers={"Content-Type": "application/json"},
-        json=data
-    )
+    r = client.post("/rest/api/webhooks", json=data)
     if r.status_code == 201:
         print(f"Hook created: {event}")
     else:
         print(f"Failed: {r.status_code} {r.text}")
 
 def list_hooks():
-    r = requests.get(f"{CONF_URL}/rest/api/webhooks", auth=(USER, PW))
+    r = client.get("/rest/api/webhooks")
     if r.status_code == 200:
         res = r.json().get('results', [])
         for h in res:
@@ -50,4 +47,6 @@ if __name__ == "__main__":
     else:
         create_hook("page_created", "/webhook/page-created")
         create_hook("page_updated", "/webhook/page-updated")
+        create_hook("attachment_created", "/webhook/attachment-created")
+        create_hook("attachment_updated", "/webhook/attachment-updated")
     print("Done.")
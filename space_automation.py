@@ -1,14 +1,23 @@
-from atlassian import Confluence
 import logging
-import requests
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from confluence_client import get_client
+from confluence_index import membership_index, permission_index
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+GROUP_TYPES = ['read', 'dev', 'admin']
+READY_TIMEOUT = float(os.getenv('SPACE_READY_TIMEOUT', '10'))
+READY_INTERVAL = float(os.getenv('SPACE_READY_INTERVAL', '0.2'))
+
 class SpaceCreationManager:
-    def __init__(self, url, username, password):
-        self.confluence = Confluence(url=url, username=username, password=password)
+    def __init__(self, url, username=None, password=None, auth=None):
+        self.client = get_client(url, username, password, auth=auth, consumer='provisioning')
+        self.confluence = self.client.confluence
+        self.memberships = membership_index(self.client)
+        self.permissions = permission_index(self.client)
         self.url = url
         self.username = username
         self.password = password
@@ -26,8 +35,7 @@ class SpaceCreationManager:
     
     def has_license(self, username):
         try:
-            members = self.confluence.get_group_members("confluence-users")
-            return any(m.get('username') == username for m in members)
+            return self.memberships.contains("confluence-users", username)
         except Exception:
             return False
     
@@ -39,7 +47,6 @@ class SpaceCreationManager:
             return False
     
     def create_space(self, key, name, desc):
-        endpoint = f"{self.url}/rest/api/space"
         payload = {
             "key": key,
             "name": name,
@@ -47,25 +54,45 @@ class SpaceCreationManager:
             "type": "global"
         }
         try:
-            r = requests.post(
-                endpoint, json=payload, 
-                auth=(self.username, self.password),
-                headers={"Accept": "application/json", "Content-Type": "application/json"}
-            )
+            r = self.client.post("/rest/api/space", json=payload)
             if r.status_code in [200, 201]:
+                self.permissions.invalidate(key)
                 return True, r.json()
             return False, r.text
         except Exception as e:
             return False, str(e)
     
-    def setup_groups(self, key):
-        for gtype in ['read', 'dev', 'admin']:
-            name = f"{key}_{gtype}"
+    def create_group(self, name):
+        try:
+            self.confluence.create_group(name)
+        except Exception:
+            pass
+
+    def create_groups(self, key, pool):
+        for f in [pool.submit(self.create_group, f"{key}_{gtype}") for gtype in GROUP_TYPES]:
+            f.result()
+
+    def setup_groups(self, key, pool):
+        # the three groups don't depend on each other, grant them side by side
+        for f in [pool.submit(self.assign_perms, key, f"{key}_{gtype}", gtype) for gtype in GROUP_TYPES]:
+            f.result()
+
+    def wait_until_ready(self, key, timeout=READY_TIMEOUT, interval=READY_INTERVAL):
+        # the admin group has to hold administer on the space before we put someone in it
+        group = f"{key}_admin"
+        deadline = time.monotonic() + timeout
+        while True:
+            self.permissions.invalidate(key)
             try:
-                self.confluence.create_group(name)
-                self.assign_perms(key, name, gtype)
-            except Exception:
-                pass
+                if group in self.permissions.holders(key, 'administer', 'group'):
+                    return True
+            except Exception as e:
+                logger.info(f"Space {key} not ready yet: {e}")
+            if time.monotonic() + interval > deadline:
+                logger.warning(f"Space {key} not ready after {timeout}s, adding admin anyway")
+                return False
+            time.sleep(interval)
+            interval = min(interval * 2, 2)
 
     def assign_perms(self, key, group, gtype):
         perms = []
@@ -82,16 +109,23 @@ class SpaceCreationManager:
             perms = [{"targetType": "space", "operationKey": "administer"}]
 
         try:
-            endpoint = f"{self.url}/rest/api/space/{key}/permissions/group/{group}/grant"
-            requests.put(
-                endpoint, json=perms, 
-                auth=(self.username, self.password),
-                headers={"Accept": "application/json", "Content-Type": "application/json"}
-            )
+            self.client.put(f"/rest/api/space/{key}/permissions/group/{group}/grant", json=perms)
+            self.permissions.invalidate(key)
         except:
             pass
 
+    def timed(self, timings, step, fn, *args):
+        start = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            timings[step] = round(time.monotonic() - start, 3)
+
     def process_request(self, data):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            return self._process(data, pool)
+
+    def _process(self, data, pool):
         name = data.get('space_name')
         key = data.get('space_key')
         desc = data.get('description', '')
@@ -99,6 +133,8 @@ class SpaceCreationManager:
         
         comments = []
         issues = []
+        timings = {}
+        started = time.monotonic()
         
         v_name, e_name = self.validate_name(name)
         if not v_name: issues.append(e_name); comments.append(f"❌ {e_name}")
@@ -106,34 +142,45 @@ class SpaceCreationManager:
         v_key, e_key = self.validate_key(key)
         if not v_key: issues.append(e_key); comments.append(f"❌ {e_key}")
         
-        if not self.user_exists(admin):
+        exists = pool.submit(self.timed, timings, 'user_exists', self.user_exists, admin)
+        licensed = pool.submit(self.timed, timings, 'has_license', self.has_license, admin)
+        if not exists.result():
             issues.append("Admin doesn't exist"); comments.append(f"⚠️ User {admin} not found")
-        elif not self.has_license(admin):
+        elif not licensed.result():
             issues.append("No license"); comments.append(f"⚠️ User {admin} has no license")
         
         if issues:
-            return {"status": "work_in_progress", "comments": comments, "issues": issues}
+            timings['total'] = round(time.monotonic() - started, 3)
+            return {"status": "work_in_progress", "comments": comments, "issues": issues, "timings": timings}
         
-        success, res = self.create_space(key, name, desc)
+        success, res = self.timed(timings, 'create_space', self.create_space, key, name, desc)
         if not success:
-            return {"status": "failed", "comments": [f"❌ Creation failed: {res}"]}
+            timings['total'] = round(time.monotonic() - started, 3)
+            return {"status": "failed", "comments": [f"❌ Creation failed: {res}"], "timings": timings}
         
+        # only once the space exists, so a failed request leaves no KEY_* groups behind
+        self.timed(timings, 'create_groups', self.create_groups, key, pool)
         url = f"{self.url}/display/{key}"
-        self.setup_groups(key)
-        
-        time.sleep(1) # Wait for sync
+        self.timed(timings, 'grant_permissions', self.setup_groups, key, pool)
+        self.timed(timings, 'wait_ready', self.wait_until_ready, key)
         
+        add_start = time.monotonic()
         try:
-            self.confluence.add_user_to_group(admin, f"{key}_admin")
+            self.confluence.add_user_to_group(username=admin, group_name=f"{key}_admin")
+            self.memberships.added(f"{key}_admin", admin)
             comments.append(f"✅ Space {key} created. {admin} added as admin.")
         except Exception as e:
             comments.append(f"⚠️ Could not add {admin} to admin group: {e}")
+        timings['add_admin'] = round(time.monotonic() - add_start, 3)
+        timings['total'] = round(time.monotonic() - started, 3)
+        logger.info(f"Space {key} provisioned: {timings}")
             
         return {
             "status": "success",
             "comments": comments,
             "space_url": url,
-            "space_key": key
+            "space_key": key,
+            "timings": timings
         }
 
 if __name__ == "__main__":
@@ -2,8 +2,23 @@
 const socket = io();
 
 // State
+const PAGE_SIZE = 50;
 let currentFilter = 'all';
 let requests = [];
+let nextCursor = null;
+let lastSync = null;
+let lastSyncId = null;
+
+// ?type=space_creation or ?space_key=ABC narrows the dashboard (and the
+// socket updates it gets) to one request type or space
+const pageParams = new URLSearchParams(location.search);
+const subscription = {};
+['type', 'space_key'].forEach(key => {
+    if (pageParams.get(key)) subscription[key] = pageParams.get(key);
+});
+
+// above this many cards in one batch the list is rebuilt in one go
+const PATCH_LIMIT = 20;
 
 // DOM Elements
 const connectionStatus = document.getElementById('connectionStatus');
@@ -12,6 +27,14 @@ const requestForm = document.getElementById('requestForm');
 const requestsList = document.getElementById('requestsList');
 const filterButtons = document.querySelectorAll('.filter-btn');
 
+// Load more button, sits right after the list
+const loadMoreBtn = document.createElement('button');
+loadMoreBtn.className = 'btn btn-small load-more-btn';
+loadMoreBtn.textContent = 'Load more';
+loadMoreBtn.style.display = 'none';
+loadMoreBtn.addEventListener('click', () => loadMore());
+requestsList.after(loadMoreBtn);
+
 // Stats elements
 const totalRequests = document.getElementById('totalRequests');
 const pendingRequests = document.getElementById('pendingRequests');
@@ -24,7 +47,13 @@ socket.on('connect', () => {
     console.log('Connected to server');
     connectionStatus.classList.add('connected');
     connectionText.textContent = 'Connected';
-    loadRequests();
+    socket.emit('subscribe', subscription);
+    // after a reconnect only fetch what changed while we were away
+    if (lastSync) {
+        syncChanges();
+    } else {
+        loadRequests();
+    }
 });
 
 socket.on('disconnect', () => {
@@ -33,44 +62,90 @@ socket.on('disconnect', () => {
     connectionText.textContent = 'Disconnected';
 });
 
-socket.on('request_created', (request) => {
-    console.log('New request created:', request);
-    requests.unshift(request);
-    renderRequests();
+// The server sends changes in batches: new requests in full, updates with
+// only the fields that changed. State is updated first, the DOM once after.
+socket.on('requests_batch', (batch) => {
+    const from = lastSync && syncCursor(lastSync, lastSyncId);
+    const touched = new Set();
+    let missed = false;
+    batch.created.forEach(request => {
+        if (mergeRequest(request)) touched.add(request.id);
+    });
+    batch.updated.forEach(delta => {
+        const current = requests.find(r => r.id === delta.id);
+        if (current) {
+            if (mergeRequest({ ...current, ...delta })) touched.add(delta.id);
+        } else if (matchesFilter(delta) && isNewEnough(delta.id)) {
+            // it belongs in this view now but we never had it in full
+            missed = true;
+        }
+    });
+    renderChanges(touched);
+    if (missed && from) syncChanges(from);
     updateStats();
-    showNotification('New request created', 'success');
+    notifyBatch(batch);
 });
 
-socket.on('request_updated', (request) => {
-    console.log('Request updated:', request);
-    const index = requests.findIndex(r => r.id === request.id);
-    if (index !== -1) {
-        requests[index] = request;
-        renderRequests();
-        updateStats();
-
-        // Show notification based on status
-        if (request.status === 'completed') {
-            showNotification(`Request #${request.id} completed successfully`, 'success');
-        } else if (request.status === 'failed') {
-            showNotification(`Request #${request.id} failed`, 'error');
-        }
+function notifyBatch(batch) {
+    if (batch.created.length === 1) {
+        showNotification('New request created', 'success');
+    } else if (batch.created.length > 1) {
+        showNotification(`${batch.created.length} new requests created`, 'success');
     }
-});
+    const completed = batch.updated.filter(d => d.status === 'completed');
+    const failed = batch.updated.filter(d => d.status === 'failed');
+    if (completed.length === 1) {
+        showNotification(`Request #${completed[0].id} completed successfully`, 'success');
+    } else if (completed.length > 1) {
+        showNotification(`${completed.length} requests completed successfully`, 'success');
+    }
+    if (failed.length === 1) {
+        showNotification(`Request #${failed[0].id} failed`, 'error');
+    } else if (failed.length > 1) {
+        showNotification(`${failed.length} requests failed`, 'error');
+    }
+}
 
 socket.on('request_deleted', (data) => {
     console.log('Request deleted:', data);
     requests = requests.filter(r => r.id !== data.id);
-    renderRequests();
+    removeCard(data.id);
     updateStats();
     showNotification('Request deleted', 'info');
 });
 
-// Load all requests
+function requestsUrl(params) {
+    const query = new URLSearchParams({ limit: PAGE_SIZE, ...subscription, ...params });
+    if (currentFilter !== 'all') {
+        query.set('status', currentFilter);
+    }
+    return `/api/requests?${query}`;
+}
+
+// the (updated_at, id) of the latest change we have, where a sync continues
+function noteSync(request) {
+    noteCursor(request.updated_at || request.created_at, request.id);
+}
+
+function noteCursor(since, sinceId) {
+    if (!lastSync || since > lastSync || (since === lastSync && sinceId > lastSyncId)) {
+        lastSync = since;
+        lastSyncId = sinceId;
+    }
+}
+
+function syncCursor(since, sinceId) {
+    return sinceId === null || sinceId === undefined ? { since } : { since, since_id: sinceId };
+}
+
+// Load the first page (newest first)
 async function loadRequests() {
     try {
-        const response = await fetch('/api/requests');
-        requests = await response.json();
+        const response = await fetch(requestsUrl({}));
+        const page = await response.json();
+        requests = page.requests;
+        nextCursor = page.next;
+        requests.forEach(noteSync);
         renderRequests();
         updateStats();
     } catch (error) {
@@ -79,6 +154,119 @@ async function loadRequests() {
     }
 }
 
+// Append the next page below the current ones
+async function loadMore() {
+    if (nextCursor === null) return;
+    try {
+        const response = await fetch(requestsUrl({ before: nextCursor }));
+        const page = await response.json();
+        nextCursor = page.next;
+        page.requests.forEach(request => {
+            requests.push(request);
+            noteSync(request);
+            requestsList.insertAdjacentHTML('beforeend', createRequestHTML(request));
+        });
+        bindDeleteButtons(requestsList);
+        loadMoreBtn.style.display = nextCursor === null ? 'none' : '';
+    } catch (error) {
+        console.error('Error loading more requests:', error);
+        showNotification('Error loading requests', 'error');
+    }
+}
+
+// Fetch only the requests changed since the last one we saw
+async function syncChanges(from = syncCursor(lastSync, lastSyncId)) {
+    try {
+        let cursor = from;
+        let more = true;
+        while (more) {
+            const response = await fetch(requestsUrl(cursor));
+            const page = await response.json();
+            const touched = new Set();
+            page.requests.forEach(request => {
+                if (mergeRequest(request)) touched.add(request.id);
+            });
+            renderChanges(touched);
+            cursor = syncCursor(page.since, page.since_id);
+            more = page.more;
+        }
+        if (cursor.since_id !== undefined) noteCursor(cursor.since, cursor.since_id);
+        updateStats();
+    } catch (error) {
+        console.error('Error syncing requests:', error);
+    }
+}
+
+function matchesFilter(request) {
+    return currentFilter === 'all' || request.status === currentFilter;
+}
+
+function removeCard(id) {
+    const card = requestsList.querySelector(`.request-item[data-id="${id}"]`);
+    if (card) card.remove();
+    if (requests.length === 0) renderRequests();
+}
+
+// only new ones go on top; older ids show up through "Load more"
+function isNewEnough(id) {
+    return requests.length === 0 || nextCursor === null || id > requests[requests.length - 1].id;
+}
+
+// Insert, replace or drop a request in the list state; true if its card changes
+function mergeRequest(request) {
+    noteSync(request);
+    const index = requests.findIndex(r => r.id === request.id);
+    if (!matchesFilter(request)) {
+        if (index === -1) return false;
+        requests.splice(index, 1);
+        return true;
+    }
+    if (index !== -1) {
+        requests[index] = request;
+    } else {
+        if (!isNewEnough(request.id)) return false;
+        requests.push(request);
+        requests.sort((a, b) => b.id - a.id);
+    }
+    return true;
+}
+
+// Bring the cards for these ids in line with the state, or rebuild the list
+// once when there are too many of them
+function renderChanges(ids) {
+    if (ids.size === 0) return;
+    if (ids.size > PATCH_LIMIT || !requestsList.querySelector('.request-item')) {
+        renderRequests();
+        return;
+    }
+    // newest first, so each new card's neighbour above is already there
+    [...ids].sort((a, b) => b - a).forEach(patchCard);
+}
+
+function patchCard(id) {
+    const card = requestsList.querySelector(`.request-item[data-id="${id}"]`);
+    const position = requests.findIndex(r => r.id === id);
+    if (position === -1) {
+        removeCard(id);
+        return;
+    }
+    const html = createRequestHTML(requests[position]);
+    if (card) {
+        card.outerHTML = html;
+    } else {
+        const after = position > 0
+            ? requestsList.querySelector(`.request-item[data-id="${requests[position - 1].id}"]`)
+            : null;
+        if (after) {
+            after.insertAdjacentHTML('afterend', html);
+        } else {
+            requestsList.insertAdjacentHTML('afterbegin', html);
+        }
+    }
+    const fresh = requestsList.querySelector(`.request-item[data-id="${id}"]`);
+    if (fresh) bindDeleteButtons(fresh);
+}
+
 // Form submission
 requestForm.addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -174,17 +362,15 @@ filterButtons.forEach(btn => {
         filterButtons.forEach(b => b.classList.remove('active'));
         btn.classList.add('active');
         currentFilter = btn.dataset.filter;
-        renderRequests();
+        loadRequests();
     });
 });
 
-// Render requests
+// Render requests (the server already filtered them)
 function renderRequests() {
-    const filteredRequests = currentFilter === 'all'
-        ? requests
-        : requests.filter(r => r.status === currentFilter);
+    loadMoreBtn.style.display = nextCursor === null ? 'none' : '';
 
-    if (filteredRequests.length === 0) {
+    if (requests.length === 0) {
         requestsList.innerHTML = `
             <div class="empty-state">
                 <div class="empty-icon">📭</div>
@@ -194,10 +380,14 @@ function renderRequests() {
         return;
     }
 
-    requestsList.innerHTML = filteredRequests.map(request => createRequestHTML(request)).join('');
+    requestsList.innerHTML = requests.map(request => createRequestHTML(request)).join('');
+    bindDeleteButtons(requestsList);
+}
 
-    // Add delete button listeners
-    document.querySelectorAll('.delete-btn').forEach(btn => {
+// Add delete button listeners
+function bindDeleteButtons(root) {
+    root.querySelectorAll('.delete-btn:not([data-bound])').forEach(btn => {
+        btn.dataset.bound = '1';
         btn.addEventListener('click', () => deleteRequest(btn.dataset.id));
     });
 }
@@ -372,13 +562,25 @@ async function deleteRequest(id) {
     }
 }
 
-// Update stats
+// Update stats from the server counters (the list only holds one page)
+let statsTimer = null;
 function updateStats() {
-    totalRequests.textContent = requests.length;
-    pendingRequests.textContent = requests.filter(r => r.status === 'pending').length;
-    processingRequests.textContent = requests.filter(r => r.status === 'processing').length;
-    completedRequests.textContent = requests.filter(r => r.status === 'completed').length;
-    failedRequests.textContent = requests.filter(r => r.status === 'failed').length;
+    // a burst of socket events only triggers one fetch
+    if (statsTimer) return;
+    statsTimer = setTimeout(async () => {
+        statsTimer = null;
+        try {
+            const response = await fetch('/api/stats');
+            const stats = await response.json();
+            totalRequests.textContent = stats.total;
+            pendingRequests.textContent = stats.pending;
+            processingRequests.textContent = stats.processing;
+            completedRequests.textContent = stats.completed;
+            failedRequests.textContent = stats.failed;
+        } catch (error) {
+            console.error('Error loading stats:', error);
+        }
+    }, 250);
 }
 
 // Show notification
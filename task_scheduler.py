@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TaskScheduler:
+    # Fixed pool of workers; tasks with the same key (space key) run one at a time,
+    # in the order they were submitted. Different keys run in parallel.
+    def __init__(self, workers=4, name='task'):
+        self.cond = threading.Condition()
+        self.waiting = {}
+        self.runnable = deque()
+        self.busy = set()
+        self.counts = {'submitted': 0, 'finished': 0, 'failed': 0}
+        self.queued = 0
+        self.wait_total = 0.0
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, key, fn, *args):
+        with self.cond:
+            if key not in self.waiting:
+                self.waiting[key] = deque()
+                # a busy key is put back on the runnable list when its task finishes
+                if key not in self.busy:
+                    self.runnable.append(key)
+            self.waiting[key].append((fn, args, time.monotonic()))
+            self.queued += 1
+            self.counts['submitted'] += 1
+            self.cond.notify()
+
+    def _next(self):
+        with self.cond:
+            while not self.runnable:
+                self.cond.wait()
+            key = self.runnable.popleft()
+            tasks = self.waiting[key]
+            fn, args, queued_at = tasks.popleft()
+            if not tasks:
+                del self.waiting[key]
+            self.busy.add(key)
+            self.queued -= 1
+            self.wait_total += time.monotonic() - queued_at
+            return key, fn, args
+
+    def _work(self):
+        while True:
+            key, fn, args = self._next()
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                logger.error(f"Task {fn.__name__}{args} for {key} failed: {e}")
+            with self.cond:
+                self.busy.discard(key)
+                self.counts['failed' if failed else 'finished'] += 1
+                if key in self.waiting:
+                    self.runnable.append(key)
+                    self.cond.notify()
+
+    def stats(self):
+        with self.cond:
+            started = self.counts['submitted'] - self.queued
+            return {
+                **self.counts, 'queued': self.queued, 'running': len(self.busy),
+                'workers': len(self.threads), 'keys_waiting': len(self.waiting),
+                'avg_wait_seconds': round(self.wait_total / started, 3) if started else 0.0
+            }
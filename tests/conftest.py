@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules sit at the top of the repo, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# fixed, so no test reaches for Vault to fingerprint a finding
+os.environ.setdefault('FINGERPRINT_KEY', 'test-fingerprint-key')
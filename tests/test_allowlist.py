@@ -0,0 +1,69 @@
+import hashlib
+import json
+import allowlist as allowlist_module
+from allowlist import Allowlist, fingerprint
+
+
+def write(path, entries):
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=2)
+
+
+def test_version_follows_the_entries(tmp_path):
+    path = str(tmp_path / 'allowlist.json')
+    write(path, [{'type': 'Password', 'text': 'changeme'}])
+    allowlist = Allowlist(path)
+    first = allowlist.version
+
+    # reformatted, same entries
+    with open(path, 'w') as f:
+        json.dump([{'text': 'changeme', 'type': 'Password'}], f)
+    assert allowlist.reload() and allowlist.version == first
+
+    write(path, [{'type': 'Password', 'text': 'changeme'}, {'type': 'Password', 'text': 'example', 'space': 'TRAIN'}])
+    assert allowlist.reload() and allowlist.version != first
+    assert Allowlist().version != first
+
+
+def test_fingerprints_are_keyed(monkeypatch):
+    fp = fingerprint('Password', 'hunter22')
+    assert fp != hashlib.sha256('Password\0hunter22'.encode()).hexdigest()
+    monkeypatch.setattr(allowlist_module, '_key', b'another key')
+    assert fingerprint('Password', 'hunter22') != fp
+
+
+def test_fingerprint_entries_match_text_entries(tmp_path):
+    path = str(tmp_path / 'allowlist.json')
+    write(path, [{'fingerprint': fingerprint('Password', 'changeme'), 'space': 'TRAIN'}])
+    allowlist = Allowlist(path)
+    secret = {'type': 'Password', 'text': 'changeme'}
+    assert allowlist.allowed(secret, space='TRAIN')
+    assert not allowlist.allowed(secret, space='ENG')
+
+
+class NoVault:
+    def fingerprint_key(self):
+        raise RuntimeError("Vault is down")
+
+
+def test_no_key_means_no_fingerprints(monkeypatch, tmp_path):
+    import vault_utils
+    from findings_ledger import FindingsLedger
+    monkeypatch.setattr(allowlist_module, '_key', None)
+    monkeypatch.delenv('FINGERPRINT_KEY')
+    monkeypatch.setattr(vault_utils, 'confluence_auth', lambda: type('Auth', (), {'provider': NoVault()})())
+    path = str(tmp_path / 'allowlist.json')
+    write(path, [{'type': 'Password', 'text': 'changeme'}])
+    secret = {'type': 'Password', 'text': 'changeme'}
+
+    # nothing is read until the first check, and without a key nothing is let through
+    allowlist = Allowlist(path)
+    assert allowlist.pending
+    assert not allowlist.allowed(secret)
+    assert allowlist.pending and allowlist.stats()['failures'] == 1
+
+    ledger = FindingsLedger(str(tmp_path / 'findings.db'))
+    ledger.record('1', 'ENG', 1, [secret])
+    ledger.flush()
+    assert ledger.summary()['total'] == 0 and ledger.stats()['no_key'] == 1
+    assert allowlist_module._key is None
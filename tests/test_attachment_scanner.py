@@ -0,0 +1,30 @@
+import requests
+from attachment_scanner import AttachmentScanner
+from mock_confluence import MockConfluence
+from scan_engine import engine
+
+
+def test_all_attachments_are_listed():
+    mock = MockConfluence()
+    url = mock.start()
+    try:
+        page_id = mock.add_page('ENG', 'Config', '<p>see attachments</p>')
+        for i in range(120):
+            mock.add_attachment(page_id, f"config{i}.env", b'password: hunter22\n')
+        # the mock hands out at most 50 per request, less than the 100 asked for
+        session = requests.Session()
+        session.auth = ('admin', 'admin')
+        atts = list(AttachmentScanner(session, url).list_attachments(page_id))
+        assert len(atts) == 120 and len({a['id'] for a in atts}) == 120
+    finally:
+        mock.stop()
+
+
+def test_secret_across_chunks_is_found_once():
+    scanner = AttachmentScanner(None, None, chunk_size=64 * 1024, overlap=4096)
+    data = b'x = 1\n' * 10922 + b'password: hunter22\n' + b'token ghp_' + b'b' * 36 + b'\n' * 2000
+    cut = 64 * 1024
+    # the first secret straddles the chunk boundary
+    assert data.index(b'password') < cut < data.index(b'hunter22') + 8
+    chunks = iter([data[i:i + cut] for i in range(0, len(data), cut)])
+    assert scanner.scan_stream(chunks) == engine.scan(data.decode())
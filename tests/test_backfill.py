@@ -0,0 +1,83 @@
+import pytest
+from backfill import BackfillCrawler
+from findings_ledger import FindingsLedger
+from mock_confluence import MockConfluence
+
+PAGES = [
+    '<p>db password: hunter22 for staging</p>',
+    '<p>token ghp_' + 'b' * 36 + ' and api_key="abcd1234efgh"</p>',
+    '<p>pwd = s3cr3t! and passwd=another1, password:third333</p>',
+    '<p>nothing to see here</p>',
+]
+
+
+@pytest.fixture
+def mock():
+    mock = MockConfluence()
+    url = mock.start()
+    for space in ('ENG', 'OPS'):
+        for i, body in enumerate(PAGES * 3):
+            mock.add_page(space, f"{space} page {i}", body)
+    yield mock, url
+    mock.stop()
+
+
+def crawl(url, tmp_path, name, ledger=None, report=None):
+    return BackfillCrawler(url, 'admin', 'admin', workers=4, page_size=5, ledger=ledger, report=report,
+                           checkpoint=str(tmp_path / f"{name}.json")).run(['ENG', 'OPS'])
+
+
+def test_rerun_writes_nothing(mock, tmp_path):
+    mock, url = mock
+    first = crawl(url, tmp_path, 'first')
+    assert first['masked'] == 18 and first['errors'] == 0
+    assert mock.calls['PUT /rest/api/content/<page_id>'] == 18
+    assert all('hunter22' not in p['body'] and 'ghp_' not in p['body'] for p in mock.pages.values())
+
+    again = crawl(url, tmp_path, 'again')
+    assert again['masked'] == 0 and again['skipped'] == 18 and again['errors'] == 0
+    assert mock.calls['PUT /rest/api/content/<page_id>'] == 18
+
+
+def test_rerun_after_edit_keeps_masked_text(mock, tmp_path):
+    mock, url = mock
+    crawl(url, tmp_path, 'first')
+    # someone edits a masked page and leaves the asterisks in place
+    page_id = next(i for i, p in mock.pages.items() if '*' in p['body'])
+    mock.edit_page(page_id, mock.pages[page_id]['body'] + '<p>updated</p>', fire=False)
+
+    again = crawl(url, tmp_path, 'again')
+    assert again['pages'] == 7 and again['secrets'] == 0 and again['masked'] == 0
+    assert mock.calls['PUT /rest/api/content/<page_id>'] == 18
+
+
+def test_findings_go_to_the_ledger(mock, tmp_path):
+    mock, url = mock
+    ledger = FindingsLedger(str(tmp_path / 'findings.db'))
+    counts = crawl(url, tmp_path, 'first', ledger)
+    summary = ledger.summary()
+    assert summary['total'] == counts['secrets'] > 0
+    assert sorted((s['space_key'], s['count']) for s in summary['top_spaces']) == [
+        ('ENG', counts['secrets'] // 2), ('OPS', counts['secrets'] // 2)]
+
+
+def test_reruns_dont_count_findings_again(mock, tmp_path):
+    mock, url = mock
+    ledger = FindingsLedger(str(tmp_path / 'findings.db'))
+    report = str(tmp_path / 'report.jsonl')
+    counts = crawl(url, tmp_path, 'dry1', ledger, report)
+    total = ledger.summary()['total']
+    assert total == counts['secrets'] > 0
+    crawl(url, tmp_path, 'dry2', ledger, report)
+    crawl(url, tmp_path, 'real', ledger)
+    assert ledger.summary()['total'] == total
+    assert ledger.stats()['duplicates'] == 2 * total
+
+
+def test_all_spaces_are_listed(mock, tmp_path):
+    mock, url = mock
+    for i in range(120):
+        mock.add_space(f"S{i}")
+    # the mock hands out at most 50 per request, less than the 100 asked for
+    crawler = BackfillCrawler(url, 'admin', 'admin', checkpoint=str(tmp_path / 'spaces.json'))
+    assert len(set(crawler.list_spaces())) == 120
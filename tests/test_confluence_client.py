@@ -0,0 +1,27 @@
+import os
+import pytest
+from confluence_client import ConfluenceClient, rate_limiter
+from mock_confluence import MockConfluence
+
+
+@pytest.fixture
+def mock():
+    mock = MockConfluence(failure_rate=1.0, failure_status=503)
+    url = mock.start()
+    yield mock, url
+    mock.stop()
+
+
+def test_only_provisioning_is_limited_by_default():
+    assert rate_limiter('provisioning').rate == float(os.getenv('CONFLUENCE_RATE_LIMIT', '20'))
+    assert rate_limiter('scanner').rate == 0
+    assert rate_limiter('backfill') is not rate_limiter('provisioning')
+
+
+def test_retries_count_against_the_limit(mock, monkeypatch):
+    mock, url = mock
+    monkeypatch.setenv('CONFLUENCE_RATE_LIMIT_RETRYTEST', '1000')
+    client = ConfluenceClient(url, 'admin', 'admin', retries=2, backoff=0, consumer='retrytest')
+    assert client.get('/rest/api/space').status_code == 503
+    assert mock.failures == 3
+    assert rate_limiter('retrytest').stats()['acquired'] == 3
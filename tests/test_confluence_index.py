@@ -0,0 +1,35 @@
+from confluence_index import GroupMembershipIndex
+
+MEMBERS = [f"user{i:03d}" for i in range(237)]
+
+
+class CappedConfluence:
+    # answers at most `cap` members per call, whatever limit is asked for
+    def __init__(self, cap=50, links=True, raw=True):
+        self.cap = cap
+        self.links = links
+        self.raw = raw
+        self.calls = 0
+
+    def get_group_members(self, group, start=0, limit=200):
+        self.calls += 1
+        limit = min(limit, self.cap)
+        results = [{'type': 'known', 'username': n} for n in MEMBERS[start:start + limit]]
+        if not self.raw:
+            return results
+        res = {'results': results, 'start': start, 'limit': limit, 'size': len(results)}
+        if self.links:
+            res['_links'] = {'next': 'more'} if start + limit < len(MEMBERS) else {}
+        return res
+
+
+def test_follows_next_link_past_server_cap():
+    confluence = CappedConfluence()
+    assert GroupMembershipIndex(confluence).fetch('confluence-users') == set(MEMBERS)
+    assert confluence.calls == 5
+
+
+def test_without_links_reads_until_empty_page():
+    for confluence in (CappedConfluence(links=False), CappedConfluence(raw=False)):
+        assert GroupMembershipIndex(confluence).fetch('confluence-users') == set(MEMBERS)
+        assert confluence.calls == 6
@@ -0,0 +1,75 @@
+import random
+import re
+import string
+import uuid
+import numpy as np
+from entropy import EntropyDetector, entropies, token_runs
+
+B64 = string.ascii_letters + string.digits + '+/'
+
+
+def shannon(token):
+    # per-character reference for the vectorized version
+    n = len(token)
+    return -sum(c / n * np.log2(c / n) for c in (token.count(ch) for ch in set(token)))
+
+
+def random_token(rng, chars, length):
+    return ''.join(rng.choice(chars) for _ in range(length))
+
+
+def test_batched_entropy_matches_per_character():
+    rng = random.Random(0)
+    tokens = [random_token(rng, rng.choice([B64, string.hexdigits[:16], 'ab12']), rng.randint(20, 200))
+              for _ in range(2000)]
+    data = np.frombuffer(''.join(tokens).encode(), dtype=np.uint8)
+    lengths = np.array([len(t) for t in tokens])
+    assert np.allclose(entropies(data, lengths), [shannon(t) for t in tokens])
+
+
+def test_token_runs_match_a_plain_loop():
+    rng = random.Random(5)
+    for _ in range(500):
+        mask = bytes(rng.random() < 0.9 for _ in range(rng.randint(0, 300)))
+        min_length = rng.choice([1, 2, 5, 8, 20])
+        expected = [m.span() for m in re.finditer(b'\1+', mask) if m.end() - m.start() >= min_length]
+        starts, ends = token_runs(mask, min_length)
+        assert [(a, e) for a, e in zip(starts, ends) if e - a >= min_length] == expected
+
+
+def test_finds_random_tokens():
+    rng = random.Random(1)
+    b64 = random_token(rng, string.ascii_letters + string.digits, 40)
+    hex32 = random_token(rng, '0123456789abcdef', 32)
+    found = EntropyDetector().scan(f"config: token={b64} key {hex32}\n")
+    assert [(s['type'], s['text']) for s in found] == [('High Entropy Base64', b64), ('High Entropy Hex', hex32)]
+
+
+def test_token_at_the_end_of_a_url_is_found():
+    token = random_token(random.Random(2), string.ascii_letters + string.digits, 40)
+    found = EntropyDetector().scan(f"https://hooks.example.com/services/{token}")
+    assert [s['text'] for s in found] == [token]
+
+
+def test_url_paths_are_not_tokens():
+    text = ('<img src="https://confluence.example.com/download/attachments/123456/image2023-10-5_14-32-11.png"/>'
+            ' see /opt/confluence-automation/secret_scanner/Build2024-Release_Candidate_7 and '
+            'https://github.example.com/org/repo/blob/main/src/main/java/com/example/Service2Impl.java')
+    assert EntropyDetector().scan(text) == []
+
+
+def test_git_shas_are_not_tokens():
+    rng = random.Random(3)
+    sha1 = random_token(rng, '0123456789abcdef', 40)
+    sha256 = random_token(rng, '0123456789abcdef', 64)
+    text = f"commit {sha1}\nsha256sum: {sha256}  release.tar.gz\nhttps://git.example.com/repo/commit/{sha1}"
+    assert EntropyDetector().scan(text) == []
+
+
+def test_uuids_are_not_tokens():
+    rng = random.Random(4)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(50)]
+    token = random_token(rng, string.ascii_letters + string.digits, 36)
+    text = ''.join(f'<ac:structured-macro ac:name="info" ac:macro-id="{i}"/>' for i in ids) + f"<p>{token}</p>"
+    # low enough that the ids would be flagged if they were scored at all
+    assert [s['text'] for s in EntropyDetector(thresholds={'base64': 3.0}).scan(text)] == [token]
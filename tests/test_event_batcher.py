@@ -0,0 +1,49 @@
+from event_batcher import EventBatcher, room_name
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, fn):
+        pass
+
+    def emit(self, event, data, to=None):
+        if to in (None, room_name()):
+            self.emitted.append((event, data))
+
+
+def batcher():
+    socketio = FakeSocketIO()
+    return EventBatcher(socketio, scope=lambda req: ('access_request', 'ENG')), socketio
+
+
+def sent(socketio):
+    batches = [data for event, data in socketio.emitted if event == 'requests_batch']
+    socketio.emitted.clear()
+    return batches
+
+
+def test_updates_only_carry_fields_that_differ_from_the_last_send():
+    events, socketio = batcher()
+    req = {'id': 1, 'status': 'pending', 'updated_at': 't0', 'result': None}
+    events.created(req)
+    events.flush()
+    assert sent(socketio) == [{'created': [req], 'updated': []}]
+
+    events.updated({**req, 'status': 'processing', 'updated_at': 't1'}, ['status', 'updated_at', 'result'])
+    events.flush()
+    assert sent(socketio) == [{'created': [], 'updated': [{'id': 1, 'status': 'processing', 'updated_at': 't1'}]}]
+
+    # set to what the clients already have: nothing goes out
+    events.updated({**req, 'status': 'processing', 'updated_at': 't1'}, ['status', 'updated_at'])
+    events.flush()
+    assert sent(socketio) == []
+    assert events.stats()['unchanged'] == 1
+
+
+def test_request_not_seen_before_is_sent_as_given():
+    events, socketio = batcher()
+    events.updated({'id': 7, 'status': 'failed', 'error': 'boom'}, ['status', 'error'])
+    events.flush()
+    assert sent(socketio) == [{'created': [], 'updated': [{'id': 7, 'status': 'failed', 'error': 'boom'}]}]
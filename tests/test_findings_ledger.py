@@ -0,0 +1,31 @@
+import sqlite3
+import time
+from findings_ledger import SCHEMA, FindingsLedger, day_of
+
+SECRET = {'type': 'Password', 'text': 'hunter22'}
+
+
+def test_same_finding_is_counted_once(tmp_path):
+    ledger = FindingsLedger(str(tmp_path / 'findings.db'))
+    for _ in range(3):
+        ledger.record('1', 'ENG', 4, [SECRET])
+        ledger.record('1', 'ENG', 4, [SECRET], attachment_id='att1')
+    # a new version of the page is a new sighting
+    ledger.record('1', 'ENG', 5, [SECRET])
+    ledger.flush()
+    assert ledger.summary()['total'] == 3
+    assert len(ledger.recent()) == 3
+
+
+def test_old_ledger_is_deduplicated(tmp_path):
+    path = str(tmp_path / 'findings.db')
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    now = int(time.time())
+    for _ in range(4):
+        db.execute("INSERT INTO findings (found_at, page_id, space_key, version, attachment_id, type, fingerprint) "
+                   "VALUES (?, '1', 'ENG', 4, NULL, 'Password', x'00')", (now,))
+    db.execute("INSERT INTO findings_daily VALUES (?, 'ENG', 'Password', 4)", (day_of(now),))
+    db.commit()
+    db.close()
+    assert FindingsLedger(path).summary()['total'] == 1
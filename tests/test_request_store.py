@@ -0,0 +1,31 @@
+import pytest
+from request_store import JSONRequestStore, SQLiteRequestStore
+
+
+@pytest.fixture(params=['sqlite', 'json'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteRequestStore(str(tmp_path / 'requests.db'))
+    return JSONRequestStore(str(tmp_path / 'requests.json'))
+
+
+def changes(store, since, since_id=None, limit=2):
+    # what the dashboard does after a reconnect: follow the cursor until a short page
+    seen = []
+    while True:
+        items = store.page(limit, since=since, since_id=since_id)
+        seen += [r['id'] for r in items]
+        if len(items) < limit:
+            return seen
+        since, since_id = items[-1]['updated_at'], items[-1]['id']
+
+
+def test_since_cursor_keeps_requests_with_the_same_timestamp(store):
+    for i in range(7):
+        store.create({'status': 'pending', 'created_at': '2024-01-01T00:00:00', 'data': {}})
+    for rid in (2, 3, 4, 5, 6):
+        store.update(rid, status='completed', updated_at='2024-01-02T10:00:00')
+    store.update(7, status='failed', updated_at='2024-01-02T11:00:00')
+    assert changes(store, '2024-01-02T00:00:00') == [2, 3, 4, 5, 6, 7]
+    assert changes(store, '2024-01-02T10:00:00', 3) == [4, 5, 6, 7]
+    assert changes(store, '2024-01-02T10:00:00') == [7]
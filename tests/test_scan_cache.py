@@ -0,0 +1,17 @@
+from scan_cache import ScanCache
+
+
+def test_verdicts_from_other_rules_are_not_trusted(tmp_path):
+    rules = ['v1']
+    path = str(tmp_path / 'cache.json')
+    cache = ScanCache(path=path, rules=lambda: rules[0])
+    cache.store('1', 'digest', 'clean', 3)
+    cache.save()
+    assert cache.lookup('1', 'digest')
+
+    rules[0] = 'v2'
+    assert cache.lookup('1', 'digest') is None
+    assert cache.get('1') is None
+    # a restart with changed patterns doesn't trust the persisted file either
+    assert ScanCache(path=path, rules=lambda: 'v2').lookup('1', 'digest') is None
+    assert ScanCache(path=path, rules=lambda: 'v1').lookup('1', 'digest')
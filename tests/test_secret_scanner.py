@@ -0,0 +1,58 @@
+import os
+from findings_ledger import FindingsLedger
+
+# no ledger file, and no scan of the test page before we look at it
+os.environ['FINDINGS_DB'] = ''
+os.environ['SCAN_DEBOUNCE_SECONDS'] = '60'
+import secret_scanner  # noqa: E402
+
+
+def pending_version(page_id):
+    with secret_scanner.coalescer.cond:
+        entry = secret_scanner.coalescer.pending.pop(page_id, None)
+    return entry and entry[1]
+
+
+def test_attachment_event_is_not_stale():
+    coalescer = secret_scanner.coalescer
+    coalescer.mark_scanned('501', 7)
+    stale = coalescer.counts['stale']
+    client = secret_scanner.app.test_client()
+    for route in ('attachment-created', 'attachment-updated'):
+        # the page is still at the version we scanned, the upload is new
+        r = client.post(f"/webhook/{route}", json={'page': {'id': 501, 'version': 7}, 'attachment': {'id': 'att9'}})
+        assert r.status_code == 202
+        assert coalescer.counts['stale'] == stale
+        assert '501' in coalescer.pending
+        assert pending_version('501') is None
+
+
+def test_page_event_for_scanned_version_is_stale():
+    coalescer = secret_scanner.coalescer
+    coalescer.mark_scanned('502', 7)
+    stale = coalescer.counts['stale']
+    r = secret_scanner.app.test_client().post('/webhook/page-updated', json={'page': {'id': 502, 'version': 7}})
+    assert r.status_code == 202
+    assert coalescer.counts['stale'] == stale + 1
+    assert '502' not in coalescer.pending
+
+
+def test_allowlist_change_invalidates_cached_verdicts(monkeypatch):
+    cache = secret_scanner.scan_cache
+    cache.store('503', 'digest', 'clean', 4, found=0)
+    assert cache.lookup('503', 'digest')
+    monkeypatch.setattr(secret_scanner.allowlist, '_version', 'reloaded')
+    assert cache.lookup('503', 'digest') is None
+
+
+def test_findings_top_and_limit_are_clamped(monkeypatch, tmp_path):
+    ledger = FindingsLedger(str(tmp_path / 'findings.db'))
+    for page_id, space in (('600', 'ENG'), ('601', 'OPS')):
+        ledger.record(page_id, space, 1, [{'type': 'Password', 'text': 'hunter22'}])
+    ledger.flush()
+    monkeypatch.setattr(secret_scanner, 'ledger', ledger)
+    client = secret_scanner.app.test_client()
+    for top, limit in (('0', '0'), ('-5', '-1')):
+        r = client.get(f"/findings?top={top}&limit={limit}")
+        assert r.status_code == 200
+        assert len(r.json['top_spaces']) == 1 and len(r.json['recent']) == 1
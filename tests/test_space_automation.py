@@ -0,0 +1,31 @@
+import pytest
+from mock_confluence import MockConfluence
+from space_automation import SpaceCreationManager
+
+
+@pytest.fixture
+def mock():
+    mock = MockConfluence()
+    url = mock.start()
+    yield mock, url
+    mock.stop()
+
+
+def request(key):
+    return {'space_name': f"Team {key}", 'space_key': key, 'space_admin': 'admin'}
+
+
+def test_failed_space_leaves_no_groups(mock):
+    mock, url = mock
+    mock.add_space('ENG')
+    res = SpaceCreationManager(url, 'admin', 'admin').process_request(request('ENG'))
+    assert res['status'] == 'failed'
+    assert not [g for g in mock.groups if g.startswith('ENG_')]
+
+
+def test_groups_created_with_the_space(mock):
+    mock, url = mock
+    res = SpaceCreationManager(url, 'admin', 'admin').process_request(request('OPS'))
+    assert res['status'] == 'success'
+    assert sorted(g for g in mock.groups if g.startswith('OPS_')) == ['OPS_admin', 'OPS_dev', 'OPS_read']
+    assert 'admin' in mock.groups['OPS_admin']
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+# a throwaway request database instead of the one under /tmp
+os.environ['REQUEST_DB'] = os.path.join(tempfile.mkdtemp(), 'requests.db')
+import ui_server  # noqa: E402
+
+
+def test_limit_is_clamped():
+    for i in range(3):
+        ui_server.store.create({'status': 'pending', 'created_at': f"2024-01-01T00:00:0{i}", 'data': {}})
+    client = ui_server.app.test_client()
+    for limit, expected in (('0', 1), ('-5', 1), ('2', 2), ('100000', 3)):
+        r = client.get(f"/api/requests?limit={limit}")
+        assert r.status_code == 200
+        assert len(r.json['requests']) == expected
+    r = client.get('/api/requests?since=2024-01-01T00:00:00&limit=0')
+    assert r.status_code == 200
+    assert r.json['requests'][0]['id'] == 2 and r.json['since_id'] == 2 and r.json['more']
+
+
+def test_bulk_task_finishes_rows_of_an_evicted_job(monkeypatch):
+    reqs = [ui_server.store.create({'status': 'pending', 'created_at': '2024-01-01T00:00:00',
+                                    'data': {'space_key': 'ENG', 'lan_id': f"u{i}"}}) for i in range(2)]
+    seen = []
+
+    def process_bulk(rows, progress):
+        seen.extend(rows)
+        for n in range(len(rows)):
+            progress(n, {'status': 'success'})
+
+    monkeypatch.setattr(ui_server.access_manager, 'process_bulk', process_bulk)
+    # no such job any more, and one request that isn't in the store
+    ui_server.run_bulk_task('evicted', [(0, reqs[0]['id']), (1, 9999), (2, reqs[1]['id'])])
+    assert [r['lan_id'] for r in seen] == ['u0', 'u1']
+    assert [ui_server.store.get(r['id'])['status'] for r in reqs] == ['completed', 'completed']
+
+
+def test_bulk_task_counts_missing_requests_as_failed(monkeypatch):
+    req = ui_server.store.create({'status': 'pending', 'created_at': '2024-01-01T00:00:00',
+                                  'data': {'space_key': 'ENG', 'lan_id': 'u9'}})
+    monkeypatch.setattr(ui_server.access_manager, 'process_bulk',
+                        lambda rows, progress: [progress(n, {'status': 'success'}) for n in range(len(rows))])
+    job = {'id': 'b1', 'total': 2, 'done': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0,
+           'rows': [{'row': 0, 'status': 'pending', 'request_id': req['id']},
+                    {'row': 1, 'status': 'pending', 'request_id': 9998}]}
+    ui_server.bulk_jobs['b1'] = job
+    ui_server.run_bulk_task('b1', [(0, req['id']), (1, 9998)])
+    assert (job['done'], job['succeeded'], job['failed']) == (2, 1, 1)
+    assert job['rows'][1]['status'] == 'failed'
@@ -1,13 +1,21 @@
 from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+import csv
+import io
 import logging
-from datetime import datetime
-import json
 import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
 from threading import Lock
 from access_automation import AccessManager
 from space_automation import SpaceCreationManager
-from vault_utils import VaultManager
+from vault_utils import confluence_auth
+from request_store import open_store, request_type, RequestStats
+from task_scheduler import TaskScheduler
+from confluence_client import rate_limiter
+from metrics import REGISTRY, gauge, timed, flask_metrics
+from event_batcher import EventBatcher, room_name
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -16,93 +24,237 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-URL = "http://57.159.25.203:8090"
+URL = os.getenv('CONFLUENCE_URL', "http://57.159.25.203:8090")
 DB_FILE = "/tmp/confluence_requests.json"
-lock = Lock()
+MAX_PAGE = 200
+MAX_BULK = int(os.getenv('MAX_BULK_ROWS', '2000'))
+ACCESS_FIELDS = ['lan_id', 'email', 'domain', 'manager', 'requester', 'full_name', 'space_key', 'access']
+
+# one of each, so every task shares the same pooled Confluence connection;
+# credentials come from Vault on first use and are refreshed in the background
+access_manager = AccessManager(URL, auth=confluence_auth())
+space_manager = SpaceCreationManager(URL, auth=confluence_auth())
+
+# SQLite by default; the old JSON file is migrated into it on first start
+store = open_store(DB_FILE)
+request_stats = RequestStats()
+request_stats.seed(store)
 
-try:
-    vault = VaultManager()
-    USER, PW = vault.get_confluence_credentials()
-except Exception as e:
-    logger.critical(f"Vault error: {e}")
-    raise RuntimeError("Vault required")
+# bounded pool for provisioning; requests for the same space key run one after another
+scheduler = TaskScheduler(workers=int(os.getenv('TASK_WORKERS', '4')))
 
-def load_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, 'r') as f:
-            return json.load(f)
-    return []
+def request_counts():
+    return {(t, status): n for t, by_status in request_stats.snapshot()["by_type"].items()
+            for status, n in by_status.items() if status != "total"}
 
-def save_db(data):
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+gauge('requests', 'Requests by type and status', ('type', 'status'), fn=request_counts)
+# dashboard updates go out every EVENT_BATCH_MS as one batch per room
+events = EventBatcher(socketio, interval=int(os.getenv('EVENT_BATCH_MS', '250')) / 1000,
+                      scope=lambda req: (request_type(req), space_of(req)))
+
+REGISTRY.stats('provisioning_tasks', scheduler.stats, 'Provisioning scheduler queue, workers and counts')
+REGISTRY.stats('dashboard_events', events.stats, 'Dashboard socket events received, coalesced and sent')
+flask_metrics(app, 'ui')
+
+def space_of(req):
+    return (req['data'].get('space_key') or '').upper()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@socketio.on('connect')
+def on_connect():
+    # everything, until the client subscribes to something narrower
+    join_room(room_name())
+
+@socketio.on('subscribe')
+def on_subscribe(data):
+    data = data or {}
+    for room in rooms():
+        if room.startswith('requests:'):
+            leave_room(room)
+    room = room_name(data.get('type'), data.get('space_key'))
+    join_room(room)
+    return {'room': room}
+
 @app.route('/api/requests', methods=['GET'])
 def get_reqs():
-    return jsonify(load_db())
+    args = request.args
+    try:
+        limit = max(1, min(int(args.get('limit', 50)), MAX_PAGE))
+        before = int(args['before']) if args.get('before') else None
+        since_id = int(args['since_id']) if args.get('since_id') else None
+    except ValueError:
+        return jsonify({"error": "limit, before and since_id must be numbers"}), 400
+    since = args.get('since') or None
+    items = store.page(limit, before=before, since=since, since_id=since_id, status=args.get('status') or None,
+                       req_type=args.get('type') or None, space_key=args.get('space_key') or None,
+                       created_from=args.get('from') or None, created_to=args.get('to') or None)
+    full = len(items) == limit
+    if since:
+        # deltas come oldest change first; (updated_at, id) of the last one is
+        # the cursor, so requests sharing a timestamp across pages aren't lost
+        if not items:
+            return jsonify({"requests": items, "since": since, "since_id": since_id, "more": False})
+        last = items[-1]
+        return jsonify({"requests": items, "since": last.get('updated_at') or last['created_at'],
+                        "since_id": last['id'], "more": full})
+    return jsonify({"requests": items, "next": items[-1]['id'] if full else None})
 
 @app.route('/api/requests', methods=['POST'])
 def create_req():
     data = request.json
-    fields = ['lan_id', 'email', 'domain', 'manager', 'requester', 'full_name', 'space_key', 'access']
-    if any(f not in data for f in fields):
+    if any(f not in data for f in ACCESS_FIELDS):
         return jsonify({"error": "Missing fields"}), 400
     
-    with lock:
-        db = load_db()
-        next_id = max([r.get('id', 0) for r in db], default=0) + 1
-        req = {
-            "id": next_id, "status": "pending", 
-            "created_at": datetime.now().isoformat(),
-            "data": data, "result": None
-        }
-        db.append(req)
-        save_db(db)
+    req = store.create({
+        "status": "pending",
+        "created_at": datetime.now().isoformat(),
+        "data": data, "result": None
+    })
+    request_stats.created(req)
     
-    socketio.emit('request_created', req)
-    socketio.start_background_task(run_access_task, next_id)
+    events.created(req)
+    scheduler.submit(space_of(req), run_access_task, req['id'])
     return jsonify(req), 201
 
+@timed
 def run_access_task(rid):
-    update_status(rid, 'processing')
-    db = load_db()
-    req = next((r for r in db if r['id'] == rid), None)
+    req = update_status(rid, 'processing')
     if not req: return
     
-    mgr = AccessManager(URL, USER, PW)
-    res = mgr.process_request(req['data'])
+    res = access_manager.process_request(req['data'])
     
     if res.get('status') == 'success':
         update_status(rid, 'completed', result=res)
     else:
         update_status(rid, 'failed', error=res.get('message'))
 
-def update_status(rid, status, error=None, result=None):
-    with lock:
-        db = load_db()
-        req = next((r for r in db if r['id'] == rid), None)
+def update_status(rid, status, **fields):
+    fields = {k: v for k, v in fields.items() if v is not None}
+    updated = store.update(rid, status=status, updated_at=datetime.now().isoformat(), **fields)
+    if not updated:
+        return None
+    previous, req = updated
+    request_stats.transition(req, previous)
+    events.updated(req, ['status', 'updated_at', *fields])
+    return req
+
+# bulk imports still running or recently finished, by id
+bulk_jobs = OrderedDict()
+bulk_lock = Lock()
+
+def parse_bulk():
+    if 'file' in request.files:
+        return list(csv.DictReader(io.StringIO(request.files['file'].read().decode('utf-8-sig'))))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    rows = request.get_json(silent=True)
+    return rows if isinstance(rows, list) else None
+
+@app.route('/api/requests/bulk', methods=['POST'])
+def bulk_req():
+    rows = parse_bulk()
+    if rows is None:
+        return jsonify({"error": "Send a JSON array or a CSV file"}), 400
+    if len(rows) > MAX_BULK:
+        return jsonify({"error": f"At most {MAX_BULK} rows per import"}), 400
+
+    bulk_id = uuid.uuid4().hex[:12]
+    job = {"id": bulk_id, "total": len(rows), "done": 0, "succeeded": 0, "failed": 0, "rejected": 0, "rows": []}
+    by_space = {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            row = {}
+        data = {k.strip(): v.strip() if isinstance(v, str) else v for k, v in row.items() if k}
+        missing = [f for f in ACCESS_FIELDS if not data.get(f)]
+        if missing:
+            job["rows"].append({"row": i, "status": "rejected", "error": f"Missing {', '.join(missing)}"})
+            job["rejected"] += 1
+            job["done"] += 1
+            continue
+        req = store.create({
+            "status": "pending", "bulk_id": bulk_id,
+            "created_at": datetime.now().isoformat(),
+            "data": data, "result": None
+        })
+        request_stats.created(req)
+        events.created(req)
+        job["rows"].append({"row": i, "status": "pending", "request_id": req['id']})
+        by_space.setdefault(space_of(req), []).append((i, req['id']))
+
+    with bulk_lock:
+        bulk_jobs[bulk_id] = job
+        while len(bulk_jobs) > 100:
+            bulk_jobs.popitem(last=False)
+    # one task per space, so a space is still only provisioned by one worker at a time
+    for key, items in by_space.items():
+        scheduler.submit(key, run_bulk_task, bulk_id, items)
+    logger.info(f"Bulk {bulk_id}: {len(rows)} rows, {job['rejected']} rejected, {len(by_space)} spaces")
+    with bulk_lock:
+        return jsonify(job), 202
+
+@app.route('/api/requests/bulk/<bulk_id>', methods=['GET'])
+def bulk_status(bulk_id):
+    with bulk_lock:
+        job = bulk_jobs.get(bulk_id)
+        if not job:
+            return jsonify({"error": "Unknown bulk id"}), 404
+        return jsonify(job)
+
+@timed
+def run_bulk_task(bulk_id, items):
+    # only the last 100 jobs are kept, an evicted one still gets its requests finished
+    with bulk_lock:
+        job = bulk_jobs.get(bulk_id)
+    live, finished_rows = [], set()
+
+    def record(row, rid, res):
+        if not job:
+            return
+        ok = res.get('status') == 'success'
+        with bulk_lock:
+            job["rows"][row].update({"status": "completed" if ok else "failed", "result": res})
+            job["succeeded" if ok else "failed"] += 1
+            job["done"] += 1
+            event = {"bulk_id": bulk_id, "row": row, "request_id": rid, "status": job["rows"][row]["status"],
+                     "done": job["done"], "total": job["total"]}
+            finished = job["done"] == job["total"]
+        events.bulk_progress(event)
+        if finished:
+            events.bulk_completed({k: v for k, v in job.items() if k != 'rows'})
+
+    for row, rid in items:
+        req = update_status(rid, 'processing')
         if req:
-            req['status'] = status
-            req['updated_at'] = datetime.now().isoformat()
-            if error: req['error'] = error
-            if result: req['result'] = result
-            save_db(db)
-            socketio.emit('request_updated', req)
+            live.append((row, rid, req))
+        else:
+            # gone from the store while it was waiting
+            record(row, rid, {"status": "error", "message": "Request not found"})
+
+    def progress(n, res):
+        row, rid, _ = live[n]
+        if res.get('status') == 'success':
+            update_status(rid, 'completed', result=res)
+        else:
+            update_status(rid, 'failed', error=res.get('message'))
+        with bulk_lock:
+            finished_rows.add(n)
+        record(row, rid, res)
+
+    try:
+        access_manager.process_bulk([req['data'] for _, _, req in live], progress)
+    except Exception as e:
+        logger.error(f"Bulk {bulk_id} stopped: {e}")
+        with bulk_lock:
+            left = [n for n in range(len(live)) if n not in finished_rows]
+        for n in left:
+            progress(n, {"status": "error", "message": str(e)})
 
 @app.route('/api/stats', methods=['GET'])
 def stats():
-    db = load_db()
-    return jsonify({
-        "total": len(db),
-        "pending": len([r for r in db if r['status'] == 'pending']),
-        "processing": len([r for r in db if r['status'] == 'processing']),
-        "completed": len([r for r in db if r['status'] == 'completed']),
-        "failed": len([r for r in db if r['status'] == 'failed'])
-    })
+    return jsonify({**request_stats.snapshot(), "tasks": scheduler.stats(), "rate_limit": rate_limiter('provisioning').stats()})
 
 @app.route('/api/space-requests', methods=['POST'])
 def space_req():
@@ -110,39 +262,27 @@ def space_req():
     if not all(k in data for k in ['space_name', 'space_key', 'space_admin']):
         return jsonify({"error": "Missing fields"}), 400
     
-    with lock:
-        db = load_db()
-        next_id = max([r.get('id', 0) for r in db], default=0) + 1
-        req = {
-            "id": next_id, "type": "space_creation", "status": "pending",
-            "created_at": datetime.now().isoformat(), "data": data
-        }
-        db.append(req)
-        save_db(db)
+    req = store.create({
+        "type": "space_creation", "status": "pending",
+        "created_at": datetime.now().isoformat(), "data": data
+    })
+    request_stats.created(req)
     
-    socketio.emit('request_created', req)
-    socketio.start_background_task(run_space_task, next_id)
+    events.created(req)
+    scheduler.submit(space_of(req), run_space_task, req['id'])
     return jsonify(req), 201
 
+@timed
 def run_space_task(rid):
-    update_status(rid, 'processing')
-    db = load_db()
-    req = next((r for r in db if r['id'] == rid), None)
+    req = update_status(rid, 'processing')
     if not req: return
     
-    mgr = SpaceCreationManager(URL, USER, PW)
-    res = mgr.process_request(req['data'])
+    res = space_manager.process_request(req['data'])
     
-    with lock:
-        db = load_db()
-        r = next((i for i in db if i['id'] == rid), None)
-        if r:
-            r['comments'] = res.get('comments', [])
-            r['status'] = 'completed' if res.get('status') == 'success' else 'failed'
-            if res.get('status') != 'success': r['error'] = res.get('error', 'Failed')
-            r['result'] = res
-            save_db(db)
-            socketio.emit('request_updated', r)
+    ok = res.get('status') == 'success'
+    update_status(rid, 'completed' if ok else 'failed',
+                  comments=res.get('comments', []), result=res,
+                  error=None if ok else res.get('error', 'Failed'))
 
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5001, debug=False, allow_unsafe_werkzeug=True)
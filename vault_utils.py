@@ -1,5 +1,16 @@
 import hvac
+import logging
 import os
+import threading
+import time
+from requests.auth import AuthBase, HTTPBasicAuth, _basic_auth_str
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv('VAULT_REFRESH_INTERVAL', '300'))
+RETRY_INTERVAL = float(os.getenv('VAULT_RETRY_INTERVAL', '30'))
+FINGERPRINT_PATH = os.getenv('FINGERPRINT_VAULT_PATH', 'fingerprint')
+
 
 class VaultManager:
     def __init__(self):
@@ -7,13 +18,169 @@ class VaultManager:
         self.token = os.getenv('VAULT_TOKEN', 'my-root-token')
         self.client = hvac.Client(url=self.url, token=self.token)
 
-    def get_confluence_credentials(self):
+    def read_confluence_secret(self):
         try:
             res = self.client.secrets.kv.v2.read_secret_version(mount_point='kv', path='confluence')
-            data = res['data']['data']
-            return data['username'], data['password']
         except Exception as e:
             raise RuntimeError(f"Vault failed: {e}")
+        data = res['data']['data']
+        meta = res['data'].get('metadata') or {}
+        # set with `vault kv metadata put -custom-metadata=ttl=600 kv/confluence`
+        ttl = (meta.get('custom_metadata') or {}).get('ttl') or res.get('lease_duration') or None
+        return data['username'], data['password'], float(ttl) if ttl else None, meta.get('version')
+
+    def read_fingerprint_key(self):
+        # set with `vault kv put kv/fingerprint key=$(openssl rand -hex 32)`
+        try:
+            res = self.client.secrets.kv.v2.read_secret_version(mount_point='kv', path=FINGERPRINT_PATH)
+        except Exception as e:
+            raise RuntimeError(f"Vault failed: {e}")
+        return res['data']['data']['key']
+
+    def get_confluence_credentials(self):
+        username, password, _, _ = self.read_confluence_secret()
+        return username, password
+
+
+class CredentialProvider:
+    # Reads the Confluence secret on first use, keeps it in memory for its TTL and
+    # re-reads it in the background shortly before that, so a rotated password
+    # is picked up without restarting anything.
+    def __init__(self, vault=None, refresh_interval=REFRESH_INTERVAL, retry_interval=RETRY_INTERVAL):
+        self.vault = vault
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.lock = threading.Lock()
+        self.credentials = None
+        self.version = None
+        self.expires = 0.0
+        self.loaded_at = 0.0
+        self.thread = None
+        self.key = None
+        self.key_retry_at = 0.0
+        self.counts = {'loads': 0, 'changes': 0, 'failures': 0}
+
+    def get(self):
+        if self.credentials is None or time.monotonic() >= self.expires:
+            self.refresh(stale_only=True)
+        return self.credentials
+
+    def refresh(self, min_age=0, stale_only=False):
+        # returns True when the username/password actually changed
+        with self.lock:
+            if self.credentials is not None:
+                # another thread may have just loaded them
+                if stale_only and time.monotonic() < self.expires:
+                    return False
+                if time.monotonic() - self.loaded_at < min_age:
+                    return False
+            if self.vault is None:
+                self.vault = VaultManager()
+            try:
+                username, password, ttl, version = self.vault.read_confluence_secret()
+            except Exception as e:
+                self.counts['failures'] += 1
+                if self.credentials is None:
+                    raise
+                # keep using what we have, Vault being down shouldn't stop the services
+                logger.error(f"Vault refresh failed, keeping cached credentials: {e}")
+                self.expires = time.monotonic() + self.retry_interval
+                return False
+            changed = self.credentials is not None and self.credentials != (username, password)
+            self.credentials = (username, password)
+            self.version = version
+            self.loaded_at = time.monotonic()
+            self.expires = self.loaded_at + (ttl or self.refresh_interval)
+            self.counts['loads'] += 1
+            if changed:
+                self.counts['changes'] += 1
+                logger.info(f"Confluence credentials changed (version {version})")
+            self._start()
+            return changed
+
+    def fingerprint_key(self):
+        # read once and kept: fingerprints from before and after must match.
+        # A failed read is retried at most every retry_interval.
+        with self.lock:
+            if self.key is not None:
+                return self.key
+            if time.monotonic() < self.key_retry_at:
+                raise RuntimeError("Vault fingerprint key not available yet")
+            if self.vault is None:
+                self.vault = VaultManager()
+            try:
+                self.key = self.vault.read_fingerprint_key()
+            except Exception:
+                self.counts['failures'] += 1
+                self.key_retry_at = time.monotonic() + self.retry_interval
+                raise
+            return self.key
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refresh_loop, name="vault-refresh", daemon=True)
+            self.thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            # wake up a little before expiry so requests never wait on Vault
+            lead = min(30.0, (self.expires - self.loaded_at) * 0.1)
+            time.sleep(max(1.0, self.expires - lead - time.monotonic()))
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Vault refresh failed: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'version': self.version, 'loaded': self.credentials is not None,
+                    'expires_in': round(max(0.0, self.expires - time.monotonic()), 1)}
+
+
+class VaultAuth(AuthBase):
+    # requests auth that reads the current credentials for every request and,
+    # on a 401, re-reads Vault once and retries if the password was rotated
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __call__(self, r):
+        username, password = self.provider.get()
+        r = HTTPBasicAuth(username, password)(r)
+        r.register_hook('response', self.handle_401)
+        return r
+
+    def handle_401(self, r, **kwargs):
+        if r.status_code != 401 or getattr(r.request, 'vault_retried', False):
+            return r
+        # if another request already picked up the new password just resend,
+        # otherwise read Vault (at most every 5s, so a burst of 401s doesn't hammer it)
+        sent = r.request.headers.get('Authorization')
+        if sent == _basic_auth_str(*self.provider.get()) and not self.provider.refresh(min_age=5):
+            return r
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep.vault_retried = True
+        username, password = self.provider.get()
+        prep = HTTPBasicAuth(username, password)(prep)
+        retry = r.connection.send(prep, **kwargs)
+        retry.history.append(r)
+        retry.request = prep
+        return retry
+
+
+_auth = None
+_lock = threading.Lock()
+
+
+def confluence_auth():
+    # one provider per process, shared by every client
+    global _auth
+    with _lock:
+        if _auth is None:
+            _auth = VaultAuth(CredentialProvider())
+        return _auth
+
 
 if __name__ == "__main__":
     v = VaultManager()